@@ -16,13 +16,44 @@ COMMAND LINE MODE:
     python build.py dev              # Build and install locally
     python build.py publish          # Bump patch version and publish
     python build.py dev --clean      # Clean build + install locally
+    python build.py dev --no-cache   # Rebuild every stage, ignoring the cache
+    python build.py stats            # Build time and VSIX size trends
+    python build.py watch            # Rebuild and sync on every save
     python build.py publish --bump minor  # Bump minor version and publish
 
 OPTIONS:
-    --clean           Remove build artifacts before building
+    --clean           Remove build artifacts (and the build cache) before building
+    --no-cache        Run every stage even if its inputs are unchanged
     --bump TYPE       Bump version (patch/minor/major) before building
     --dry-run         Show what would happen without doing it
     --help            Show this help message
+
+BUILD CACHE:
+    `dev` fingerprints the inputs of each stage (source files, lockfiles,
+    tool versions) in .build-cache.json and skips stages whose inputs and
+    outputs are unchanged. The slides runtime, TypeScript compile and
+    binary copy are independent and run concurrently. `publish` always
+    rebuilds everything.
+
+PACKAGE SIZE:
+    After packaging, the .vsix is broken down by directory and file type
+    and checked against the size budget in build-config.json; a package
+    over budget fails the build. The same file can list which Excalidraw
+    locale and Mermaid diagram chunks to ship, pruning the rest.
+
+WATCH MODE:
+    `watch` builds and installs once, then watches src/, slides-runtime/src/,
+    kernel/ and assets/. Each burst of edits re-runs only the compile stages
+    whose inputs changed and mirrors the results into the installed
+    extension (pruned chunks left out, deleted files removed), skipping
+    packaging. Uses the `watchdog` package for native
+    file events when installed, and polls otherwise.
+
+BUILD HISTORY:
+    Every dev/publish run times each stage and subprocess (with peak child
+    RSS where the OS reports it) and appends one JSON record to
+    .build-history.jsonl. `python build.py stats` compares the latest build
+    against the rolling median and shows VSIX size over time.
 """
 
 import subprocess
@@ -31,8 +62,18 @@ import os
 import json
 import shutil
 import re
+import hashlib
+import threading
+import time
+import statistics
+import tempfile
+import zipfile
+import queue
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 
 # Extension directory (where this script lives)
 ROOT = Path(__file__).parent
@@ -53,36 +94,48 @@ class C:
     DIM = '\033[2m'
     END = '\033[0m'
 
+# Stages running on worker threads collect their output here and print it
+# in one piece when they finish, so concurrent stages don't interleave.
+_log = threading.local()
+
+def emit(text: str = ""):
+    """Print a line, or buffer it if the current thread is a parallel stage."""
+    buffer = getattr(_log, "buffer", None)
+    if buffer is not None:
+        buffer.append(text)
+    else:
+        print(text)
+
 def header(text: str):
     """Print a section header."""
     width = 60
-    print(f"\n{C.BOLD}{C.CYAN}{'━' * width}{C.END}")
-    print(f"{C.BOLD}{C.CYAN}  {text}{C.END}")
-    print(f"{C.BOLD}{C.CYAN}{'━' * width}{C.END}\n")
+    emit(f"\n{C.BOLD}{C.CYAN}{'━' * width}{C.END}")
+    emit(f"{C.BOLD}{C.CYAN}  {text}{C.END}")
+    emit(f"{C.BOLD}{C.CYAN}{'━' * width}{C.END}\n")
 
 def step(msg: str):
     """Print a step being performed."""
-    print(f"{C.CYAN}{C.BOLD}▶{C.END} {msg}")
+    emit(f"{C.CYAN}{C.BOLD}▶{C.END} {msg}")
 
 def success(msg: str):
     """Print a success message."""
-    print(f"  {C.GREEN}✓{C.END} {msg}")
+    emit(f"  {C.GREEN}✓{C.END} {msg}")
 
 def warn(msg: str):
     """Print a warning message."""
-    print(f"  {C.YELLOW}⚠{C.END} {msg}")
+    emit(f"  {C.YELLOW}⚠{C.END} {msg}")
 
 def error(msg: str):
     """Print an error message."""
-    print(f"  {C.RED}✗{C.END} {msg}")
+    emit(f"  {C.RED}✗{C.END} {msg}")
 
 def info(msg: str):
     """Print an info message."""
-    print(f"  {C.DIM}ℹ{C.END} {msg}")
+    emit(f"  {C.DIM}ℹ{C.END} {msg}")
 
 def explain(msg: str):
     """Print an explanation (dimmed)."""
-    print(f"  {C.DIM}{msg}{C.END}")
+    emit(f"  {C.DIM}{msg}{C.END}")
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # Command Execution
@@ -94,20 +147,267 @@ def run(
     capture: bool = True,
     env: Optional[dict] = None,
 ) -> Tuple[bool, str]:
-    """Run a command and return (success, output)."""
+    """Run a command and return (success, output). Timed into the build profile."""
+    started = time.perf_counter()
+    ok = False
+    peak_rss = None
     try:
-        result = subprocess.run(
-            cmd, cwd=cwd, env=env,
-            capture_output=capture, text=True, timeout=300
-        )
-        output = (result.stdout or '') + (result.stderr or '')
-        return result.returncode == 0, output
+        if hasattr(os, "wait4"):
+            returncode, output, peak_rss = _run_wait4(cmd, cwd, capture, env)
+        else:
+            result = subprocess.run(
+                cmd, cwd=cwd, env=env,
+                capture_output=capture, text=True, timeout=300
+            )
+            returncode = result.returncode
+            output = (result.stdout or '') + (result.stderr or '')
+        ok = returncode == 0
+        return ok, output
     except subprocess.TimeoutExpired:
         return False, "Command timed out after 5 minutes"
     except FileNotFoundError:
         return False, f"Command not found: {cmd[0]}"
     except Exception as e:
         return False, str(e)
+    finally:
+        if PROFILE is not None:
+            PROFILE.record_command(cmd, time.perf_counter() - started, ok, peak_rss)
+
+def _run_wait4(cmd: list, cwd: Path, capture: bool, env: Optional[dict]) -> Tuple[int, str, int]:
+    """
+    Like subprocess.run, but reaps the child with os.wait4 to learn its peak
+    RSS (which includes the descendants it waited for, e.g. tsc under npm).
+    Returns (returncode, output, peak_rss_bytes).
+    """
+    pipe = subprocess.PIPE if capture else None
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=pipe, stderr=pipe, text=True)
+    
+    output = {"stdout": "", "stderr": ""}
+    def drain(name: str):
+        output[name] = getattr(proc, name).read()
+    readers = [threading.Thread(target=drain, args=(name,))
+               for name in ("stdout", "stderr") if getattr(proc, name)]
+    for reader in readers:
+        reader.start()
+    
+    timed_out = threading.Event()
+    def kill():
+        timed_out.set()
+        proc.kill()
+    timer = threading.Timer(300, kill)
+    timer.start()
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    finally:
+        timer.cancel()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    for reader in readers:
+        reader.join()
+    for stream in (proc.stdout, proc.stderr):
+        if stream:
+            stream.close()
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, 300)
+    
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return proc.returncode, output["stdout"] + output["stderr"], peak_rss
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Build Cache
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+CACHE_FILE = ROOT / ".build-cache.json"
+
+# Never part of any stage's inputs
+CACHE_IGNORE = {"node_modules", "__pycache__", ".git", ".DS_Store"}
+# Outputs that stages write inside their own input trees (npm run compile
+# regenerates the svelte catalog from zef-svelte-components/)
+CACHE_EXCLUDE = {"src/generated"}
+
+class BuildCache:
+    """
+    Remembers a content fingerprint of each stage's inputs from its last
+    successful run. File hashes are memoized by (size, mtime) so an
+    unchanged tree is fingerprinted from stat() calls alone.
+    """
+
+    def __init__(self, path: Path = CACHE_FILE, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self.files: dict = {}
+        self.stages: dict = {}
+        self._tool_versions: dict = {}
+        if enabled and path.exists():
+            try:
+                data = json.loads(path.read_text())
+                self.files = data.get("files", {})
+                self.stages = data.get("stages", {})
+            except (OSError, json.JSONDecodeError):
+                warn(f"Ignoring unreadable build cache {path.name}")
+
+    def _file_hash(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path)
+        cached = self.files.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        self.files[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    @staticmethod
+    def _excluded(path: Path) -> bool:
+        # Inputs such as the sibling installer/CLI dist dirs live outside ROOT
+        try:
+            return path.relative_to(ROOT).as_posix() in CACHE_EXCLUDE
+        except ValueError:
+            return False
+
+    def _walk(self, path: Path):
+        if path.is_file():
+            yield path
+        elif path.is_dir():
+            for child in sorted(path.iterdir()):
+                if child.name in CACHE_IGNORE or self._excluded(child):
+                    continue
+                yield from self._walk(child)
+
+    def tool_version(self, cmd: list) -> str:
+        key = " ".join(cmd)
+        if key not in self._tool_versions:
+            ok, out = run(cmd)
+            self._tool_versions[key] = out.strip() if ok else "unavailable"
+        return self._tool_versions[key]
+
+    def fingerprint(self, inputs: list, tools: list = ()) -> str:
+        """Hash the contents of every file under `inputs`, plus tool versions."""
+        h = hashlib.sha256()
+        for inp in inputs:
+            base = ROOT / inp
+            for path in self._walk(base):
+                h.update(f"{inp}/{path.relative_to(base)}".encode())
+                h.update(self._file_hash(path).encode())
+        for cmd in tools:
+            h.update(self.tool_version(cmd).encode())
+        return h.hexdigest()
+
+    def is_fresh(self, stage: str, fingerprint: str, outputs: list) -> bool:
+        """True if `stage` last succeeded with these inputs and its outputs exist."""
+        return (
+            self.enabled
+            and self.stages.get(stage) == fingerprint
+            and all((ROOT / o).exists() for o in outputs)
+        )
+
+    def record(self, stage: str, fingerprint: str):
+        self.stages[stage] = fingerprint
+
+    def forget(self, stage: str):
+        self.stages.pop(stage, None)
+
+    def save(self):
+        if not self.enabled:
+            return
+        # Drop memoized hashes of files that no longer exist
+        self.files = {k: v for k, v in self.files.items() if Path(k).exists()}
+        self.path.write_text(json.dumps({"files": self.files, "stages": self.stages}))
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Build Profiling
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+HISTORY_FILE = ROOT / ".build-history.jsonl"
+
+class BuildProfile:
+    """Timings of one build: each stage, and every subprocess it ran."""
+
+    def __init__(self, workflow: str):
+        self.workflow = workflow
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self._t0 = time.perf_counter()
+        self.stages: dict = {}
+        self.commands: list = []
+        self.vsix_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def record_command(self, cmd: list, seconds: float, ok: bool, peak_rss: Optional[int]):
+        with self._lock:
+            self.commands.append({
+                "stage": getattr(_log, "stage", None),
+                "cmd": " ".join(str(c) for c in cmd),
+                "seconds": round(seconds, 3),
+                "ok": ok,
+                "peak_rss_mb": round(peak_rss / (1024 * 1024), 1) if peak_rss else None,
+            })
+
+    def record_stage(self, name: str, seconds: float, skipped: bool):
+        with self._lock:
+            self.stages[name] = {"seconds": round(seconds, 3), "skipped": skipped}
+
+    def to_record(self, ok: bool) -> dict:
+        return {
+            "timestamp": self.started,
+            "workflow": self.workflow,
+            "version": get_version(),
+            "ok": ok,
+            "total_seconds": round(time.perf_counter() - self._t0, 3),
+            "stages": self.stages,
+            "commands": self.commands,
+            "vsix_bytes": self.vsix_bytes,
+        }
+
+# The profile of the build in progress, if any
+PROFILE: Optional[BuildProfile] = None
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a build stage. Yields a dict; set ["skipped"] = True when the stage
+    turned out to be up to date. Subprocesses run inside are attributed to it.
+    """
+    previous = getattr(_log, "stage", None)
+    _log.stage = name
+    state = {"skipped": False}
+    started = time.perf_counter()
+    try:
+        yield state
+    finally:
+        _log.stage = previous
+        if PROFILE is not None:
+            PROFILE.record_stage(name, time.perf_counter() - started, state["skipped"])
+
+def profiled(workflow: str):
+    """Decorator: profile a workflow and append its record to the history file."""
+    def decorate(fn):
+        def wrapper(*args, **kwargs):
+            global PROFILE
+            PROFILE = BuildProfile(workflow)
+            ok = False
+            try:
+                fn(*args, **kwargs)
+                ok = True
+            finally:
+                record = PROFILE.to_record(ok)
+                PROFILE = None
+                try:
+                    with open(HISTORY_FILE, "a") as f:
+                        f.write(json.dumps(record) + "\n")
+                except OSError as e:
+                    warn(f"Could not write build history: {e}")
+                print_build_timings(record)
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__name__ = fn.__name__
+        return wrapper
+    return decorate
+
+def print_build_timings(record: dict):
+    """Print the per-stage timing summary of one build."""
+    print(f"  {C.BOLD}Build timings{C.END} {C.DIM}({record['total_seconds']:.1f}s total){C.END}")
+    for name, st in record["stages"].items():
+        note = f"{C.DIM}skipped{C.END}" if st["skipped"] else ""
+        print(f"    {name:<16} {st['seconds']:>7.2f}s  {note}")
+    print()
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # Version Management
@@ -187,6 +487,14 @@ def clean_build():
     for vsix in ROOT.glob("*.vsix"):
         vsix.unlink()
         success(f"Removed {vsix.name}")
+    
+    if CACHE_FILE.exists():
+        CACHE_FILE.unlink()
+        success(f"Removed {CACHE_FILE.name}")
+
+def installed_extension_dir() -> Path:
+    """Where VS Code unpacks the current version of this extension."""
+    return Path.home() / ".vscode" / "extensions" / f"ulfbissbort.zef-{get_version()}"
 
 def remove_old_extensions(keep_version: str):
     """Remove old extension versions from VS Code extensions folder."""
@@ -220,16 +528,19 @@ def check_requirements():
         error("npm not found")
         sys.exit(1)
 
-def compile_typescript():
-    """Compile the vendored slides runtime, then TypeScript source."""
+def compile_slides_runtime() -> bool:
+    """Compile the vendored slides runtime to slides-runtime/compiled.html."""
     step("Compiling vendored slides runtime...")
     ok, out = run(["zef", "svelte", "compile", "--project", "slides-runtime", "--output", "compiled.html"])
     if not ok:
         error("Slides runtime compilation failed:")
-        print(out)
+        emit(out)
         return False
     success("Slides runtime compiled successfully")
+    return True
 
+def compile_extension() -> bool:
+    """Compile the extension's TypeScript source."""
     step("Compiling TypeScript...")
     explain("Transpiles src/*.ts to out/*.js using the TypeScript compiler")
     
@@ -239,22 +550,25 @@ def compile_typescript():
         return True
     else:
         error("Compilation failed:")
-        print(out)
+        emit(out)
         return False
 
-def copy_installer_binaries():
+INSTALLER_DIST = ROOT.parent / "zef-installer" / "dist"
+CLI_DIST = ROOT.parent / "zef-cli" / "dist"
+
+def copy_installer_binaries() -> bool:
     """Copy zef-install and zef CLI binaries into resources/bin/."""
     bin_dir = ROOT / "resources" / "bin"
     bin_dir.mkdir(parents=True, exist_ok=True)
     
     sources = [
         # (dist_dir, binaries_dict, label)
-        (ROOT.parent / "zef-installer" / "dist", {
+        (INSTALLER_DIST, {
             "zef-install-macos-arm64":          "zef-install-macos-arm64",
             "zef-install-linux-x86_64":         "zef-install-linux-x86_64",
             "zef-install-windows-x86_64.exe":   "zef-install-windows-x86_64.exe",
         }, "installer"),
-        (ROOT.parent / "zef-cli" / "dist", {
+        (CLI_DIST, {
             "zef-macos-arm64":          "zef-macos-arm64",
             "zef-linux-x86_64":         "zef-linux-x86_64",
         }, "CLI"),
@@ -287,20 +601,30 @@ def copy_installer_binaries():
     
     if total_copied == 0:
         warn("No binaries found — VSIX will have no bundled tools")
+    return True
 
 def package_extension() -> Optional[Path]:
     """Create .vsix package file."""
     step("Packaging extension...")
     explain("Creates a .vsix file containing all extension files")
     
-    # Copy installer binaries from zef-installer before packaging
-    copy_installer_binaries()
-    
     version = get_version()
     for old_vsix in ROOT.glob("*.vsix"):
         old_vsix.unlink()
     
-    ok, out = run(["npx", "vsce", "package", "--allow-missing-repository"])
+    cmd = ["npx", "vsce", "package", "--allow-missing-repository"]
+    patterns = prune_patterns(load_build_config())
+    ignore_file = None
+    if patterns:
+        ignore_file = pruned_ignore_file(patterns)
+        cmd += ["--ignoreFile", str(ignore_file)]
+        info(f"Pruning {len(patterns)} Excalidraw locale/diagram chunk(s) not on the allowlist")
+    
+    try:
+        ok, out = run(cmd)
+    finally:
+        if ignore_file:
+            ignore_file.unlink()
     
     vsix_file = ROOT / f"zef-{version}.vsix"
     if vsix_file.exists():
@@ -330,7 +654,7 @@ def install_local(vsix_path: Path) -> bool:
         success(f"Installed {vsix_path.name}")
         
         # Verify installation
-        ext_dir = Path.home() / ".vscode" / "extensions" / f"ulfbissbort.zef-{version}"
+        ext_dir = installed_extension_dir()
         if ext_dir.exists():
             success(f"Verified at {ext_dir}")
         
@@ -340,6 +664,221 @@ def install_local(vsix_path: Path) -> bool:
         print(out)
         return False
 
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Package Size
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+BUILD_CONFIG = ROOT / "build-config.json"
+EXCALIDRAW_DIR = "assets/excalidraw-editor"
+
+# Lazily loaded Excalidraw chunks: "de-DE-XR44H4JA.js" is the de-DE locale,
+# "classDiagram-v2-f2320105.js" and "flowchart-elk-definition-4a651766.js"
+# are Mermaid diagram types
+LOCALE_CHUNK = re.compile(r"^([a-z]{2,3}(?:-[A-Z]{2,3})?)-[A-Z0-9]{8}\.js$")
+DIAGRAM_CHUNK = re.compile(r"^([\w-]+?(?:Diagram|-definition)(?:-v2)?)-[0-9a-f]{8}\.js$")
+
+def load_build_config() -> dict:
+    """Read build-config.json (missing file means defaults)."""
+    if not BUILD_CONFIG.exists():
+        return {}
+    try:
+        return json.loads(BUILD_CONFIG.read_text())
+    except json.JSONDecodeError as e:
+        error(f"Invalid {BUILD_CONFIG.name}: {e}")
+        sys.exit(1)
+
+def prune_patterns(config: dict) -> list:
+    """
+    .vscodeignore patterns for Excalidraw locale and diagram chunks that are
+    not on the allowlists in build-config.json. Empty unless pruning is on.
+    """
+    prune = config.get("vsix", {}).get("prune", {})
+    if not prune.get("enabled"):
+        return []
+    keep_locales = set(prune.get("locales", []))
+    keep_diagrams = set(prune.get("diagrams", []))
+    
+    patterns = []
+    for path in sorted((ROOT / EXCALIDRAW_DIR).glob("*.js")):
+        locale = LOCALE_CHUNK.match(path.name)
+        diagram = DIAGRAM_CHUNK.match(path.name)
+        if (locale and locale.group(1) not in keep_locales) or \
+           (diagram and diagram.group(1) not in keep_diagrams):
+            patterns.append(f"{EXCALIDRAW_DIR}/{path.name}")
+    return patterns
+
+def pruned_ignore_file(patterns: list) -> Path:
+    """Write .vscodeignore plus `patterns` to a temp file for vsce --ignoreFile."""
+    base = (ROOT / ".vscodeignore").read_text()
+    fd, name = tempfile.mkstemp(prefix="zef-vscodeignore-")
+    with os.fdopen(fd, "w") as f:
+        f.write(base.rstrip("\n") + "\n\n# Pruned by build.py (build-config.json)\n")
+        f.write("\n".join(patterns) + "\n")
+    return Path(name)
+
+def _size(n: int) -> str:
+    return f"{n / (1024 * 1024):.2f} MB" if n >= 1024 * 1024 else f"{n / 1024:.0f} KB"
+
+def check_vsix_size(vsix_path: Path) -> bool:
+    """
+    Print a size breakdown of the .vsix by directory and file type, and
+    check it against vsix.budgetMB in build-config.json.
+    """
+    step("Analyzing package size...")
+    by_dir: dict = {}
+    by_type: dict = {}
+    with zipfile.ZipFile(vsix_path) as zf:
+        for entry in zf.infolist():
+            if entry.is_dir():
+                continue
+            # Entries live under extension/; group two levels below that
+            parts = entry.filename.split("/")
+            parts = parts[1:] if parts[0] == "extension" else parts
+            group = "/".join(parts[:2]) if len(parts) > 2 else (parts[0] if len(parts) > 1 else "(root)")
+            suffix = Path(entry.filename).suffix.lower() or "(none)"
+            for table, key in ((by_dir, group), (by_type, suffix)):
+                row = table.setdefault(key, [0, 0, 0])
+                row[0] += 1
+                row[1] += entry.compress_size
+                row[2] += entry.file_size
+    
+    def show(title: str, table: dict, limit: int = 10):
+        emit(f"  {C.BOLD}{title:<36} {'files':>6} {'packed':>10} {'unpacked':>10}{C.END}")
+        rows = sorted(table.items(), key=lambda kv: kv[1][1], reverse=True)
+        for key, (count, packed, unpacked) in rows[:limit]:
+            emit(f"  {key:<36} {count:>6} {_size(packed):>10} {_size(unpacked):>10}")
+        if len(rows) > limit:
+            rest = rows[limit:]
+            emit(f"  {C.DIM}{f'({len(rest)} more)':<36} {sum(r[1][0] for r in rest):>6} "
+                 f"{_size(sum(r[1][1] for r in rest)):>10} {_size(sum(r[1][2] for r in rest)):>10}{C.END}")
+        emit()
+    
+    show("By directory", by_dir)
+    show("By file type", by_type)
+    
+    size = vsix_path.stat().st_size
+    budget_mb = load_build_config().get("vsix", {}).get("budgetMB")
+    if budget_mb is None:
+        info(f"{vsix_path.name}: {_size(size)} (no size budget configured)")
+        return True
+    if size > budget_mb * 1024 * 1024:
+        error(f"{vsix_path.name} is {_size(size)}, over the {budget_mb} MB budget in {BUILD_CONFIG.name}")
+        return False
+    success(f"{vsix_path.name}: {_size(size)} of {budget_mb} MB budget")
+    return True
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Build Stages
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+# Everything vsce may put into the .vsix (see .vscodeignore)
+PACKAGE_INPUTS = [
+    "out", "kernel", "assets", "resources", "syntaxes", "svelte-compiler",
+    "zef-svelte-components", "slides-runtime/compiled.html",
+    "language-configuration.json", "icon.png", "package.json",
+    "package-lock.json", "README.md", "CHANGELOG.md", "LICENSE", ".vscodeignore",
+    "build-config.json",
+]
+
+# (name, function, inputs, tool version commands, outputs). These have no
+# dependencies on each other and run concurrently.
+COMPILE_STAGES = [
+    ("slides runtime", compile_slides_runtime,
+     ["slides-runtime/src"], [["zef", "--version"]],
+     ["slides-runtime/compiled.html"]),
+    ("typescript", compile_extension,
+     ["src", "scripts", "zef-svelte-components", "tsconfig.json", "package.json", "package-lock.json"],
+     [["node", "--version"], ["npm", "--version"]],
+     ["out"]),
+    ("binaries", copy_installer_binaries,
+     [INSTALLER_DIST, CLI_DIST], [],
+     ["resources/bin"]),
+]
+
+def _run_buffered(name: str, fn: Callable[[], bool]) -> Tuple[bool, list]:
+    """Run a stage on a worker thread, collecting its output."""
+    _log.buffer = []
+    try:
+        with stage(name):
+            ok = bool(fn())
+    except Exception as e:
+        error(f"{type(e).__name__}: {e}")
+        ok = False
+    finally:
+        lines, _log.buffer = _log.buffer, None
+    return ok, lines
+
+def run_compile_stages(cache: BuildCache) -> bool:
+    """Run the compile stages whose inputs changed, in parallel."""
+    pending = []
+    for name, fn, inputs, tools, outputs in COMPILE_STAGES:
+        with stage(name) as st:
+            fingerprint = cache.fingerprint(inputs, tools)
+            st["skipped"] = cache.is_fresh(name, fingerprint, outputs)
+        if st["skipped"]:
+            success(f"{name}: up to date, skipped")
+        else:
+            pending.append((name, fn, fingerprint))
+    if not pending:
+        return True
+    
+    step(f"Running {', '.join(name for name, *_ in pending)} in parallel...")
+    all_ok = True
+    with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+        futures = [(name, fingerprint, pool.submit(_run_buffered, name, fn))
+                   for name, fn, fingerprint in pending]
+        for name, fingerprint, future in futures:
+            ok, lines = future.result()
+            for line in lines:
+                emit(line)
+            if ok:
+                # The inputs as they were before the compiler read them: a file
+                # saved mid-compile must make the next run build again
+                cache.record(name, fingerprint)
+            else:
+                cache.forget(name)
+                all_ok = False
+    cache.save()
+    return all_ok
+
+def cached_package(cache: BuildCache) -> Optional[Path]:
+    """Package the .vsix unless an identical one already exists."""
+    vsix_name = f"zef-{get_version()}.vsix"
+    with stage("package") as st:
+        fingerprint = cache.fingerprint(PACKAGE_INPUTS)
+        if cache.is_fresh("package", fingerprint, [vsix_name]):
+            st["skipped"] = True
+            success(f"package: up to date, reusing {vsix_name}")
+            vsix_path = ROOT / vsix_name
+        else:
+            vsix_path = package_extension()
+            if vsix_path:
+                cache.record("package", fingerprint)
+            else:
+                cache.forget("package")
+            cache.save()
+    if vsix_path and PROFILE is not None:
+        PROFILE.vsix_bytes = vsix_path.stat().st_size
+    return vsix_path
+
+def cached_install(cache: BuildCache, vsix_path: Path) -> bool:
+    """Install the .vsix unless this exact file is already installed."""
+    ext_dir = installed_extension_dir()
+    with stage("install") as st:
+        fingerprint = cache.fingerprint([vsix_path])
+        if cache.is_fresh("install", fingerprint, [ext_dir]):
+            st["skipped"] = True
+            success(f"install: {vsix_path.name} already installed, skipped")
+            return True
+        
+        ok = install_local(vsix_path)
+        if ok:
+            cache.record("install", fingerprint)
+        else:
+            cache.forget("install")
+        cache.save()
+        return ok
+
 MARKETPLACE_SECRET_LABEL = "VS Code Marketplace PAT"
 MARKETPLACE_SECRET_TAGS = ["vscode", "marketplace", "publish", "api-token"]
 
@@ -459,7 +998,8 @@ def publish_marketplace() -> bool:
 # High-Level Workflows
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-def workflow_dev(clean: bool = False, bump_type: Optional[str] = None):
+@profiled("dev")
+def workflow_dev(clean: bool = False, bump_type: Optional[str] = None, use_cache: bool = True):
     """
     Local Development Workflow
     
@@ -470,11 +1010,15 @@ def workflow_dev(clean: bool = False, bump_type: Optional[str] = None):
     Steps:
     1. Clean build artifacts (optional)
     2. Bump version (optional)
-    3. Compile TypeScript → out/*.js
-    4. Package as .vsix
+    3. Compile slides runtime and TypeScript → out/*.js, copy binaries
+       (in parallel)
+    4. Package as .vsix, check it against the size budget
     5. Install to local VS Code
     6. Remove old extension versions
     
+    Steps 3-5 are skipped when their inputs haven't changed since the last
+    successful run (see BuildCache); pass use_cache=False to force them.
+    
     After this, reload VS Code (Cmd+Shift+P → 'Reload Window') to use the
     updated extension.
     """
@@ -496,19 +1040,28 @@ def workflow_dev(clean: bool = False, bump_type: Optional[str] = None):
     info(f"Directory: {ROOT}")
     print()
     
-    check_requirements()
+    with stage("requirements"):
+        check_requirements()
     print()
     
-    if not compile_typescript():
+    cache = BuildCache(enabled=use_cache)
+    
+    if not run_compile_stages(cache):
         sys.exit(1)
     print()
     
-    vsix_path = package_extension()
+    vsix_path = cached_package(cache)
     if not vsix_path:
         sys.exit(1)
     print()
     
-    if not install_local(vsix_path):
+    with stage("size check"):
+        within_budget = check_vsix_size(vsix_path)
+    if not within_budget:
+        sys.exit(1)
+    print()
+    
+    if not cached_install(cache, vsix_path):
         sys.exit(1)
     
     # Success message
@@ -518,6 +1071,7 @@ def workflow_dev(clean: bool = False, bump_type: Optional[str] = None):
     print(f"\n  {C.YELLOW}Next step:{C.END} Reload VS Code")
     print(f"  {C.DIM}Cmd+Shift+P → 'Developer: Reload Window'{C.END}\n")
 
+@profiled("publish")
 def workflow_publish(clean: bool = False, bump_type: Optional[str] = None):
     """
     Marketplace Publishing Workflow
@@ -529,8 +1083,8 @@ def workflow_publish(clean: bool = False, bump_type: Optional[str] = None):
     Steps:
     1. Clean build artifacts (optional)
     2. Bump version (required for new release)
-    3. Compile TypeScript
-    4. Package as .vsix
+    3. Compile slides runtime and TypeScript, copy binaries (in parallel)
+    4. Package as .vsix, check it against the size budget
     5. Verify Personal Access Token
     6. Upload to marketplace
     
@@ -559,19 +1113,31 @@ def workflow_publish(clean: bool = False, bump_type: Optional[str] = None):
     info(f"Directory: {ROOT}")
     print()
     
-    check_requirements()
+    with stage("requirements"):
+        check_requirements()
     print()
     
-    if not compile_typescript():
+    # Releases never trust the cache, but still compile in parallel
+    if not run_compile_stages(BuildCache(enabled=False)):
         sys.exit(1)
     print()
     
-    vsix_path = package_extension()
+    with stage("package"):
+        vsix_path = package_extension()
     if not vsix_path:
         sys.exit(1)
+    PROFILE.vsix_bytes = vsix_path.stat().st_size
+    print()
+    
+    with stage("size check"):
+        within_budget = check_vsix_size(vsix_path)
+    if not within_budget:
+        sys.exit(1)
     print()
     
-    if not publish_marketplace():
+    with stage("publish"):
+        published = publish_marketplace()
+    if not published:
         sys.exit(1)
     
     # Success message
@@ -582,6 +1148,285 @@ def workflow_publish(clean: bool = False, bump_type: Optional[str] = None):
     print(f"  {C.CYAN}URL:{C.END} https://marketplace.visualstudio.com/items?itemName=UlfBissbort.zef")
     print(f"\n  {C.DIM}Note: May take 5-10 minutes for the marketplace to update.{C.END}\n")
 
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Build Statistics
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+# A stage counts as regressed when it is this much slower than its median
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_SECONDS = 0.5
+STATS_WINDOW = 10
+
+def load_history() -> list:
+    """Read all build records, skipping lines that don't parse."""
+    if not HISTORY_FILE.exists():
+        return []
+    records = []
+    for line in HISTORY_FILE.read_text().splitlines():
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return records
+
+def show_stats():
+    """
+    Build Statistics
+    
+    Shows the latest build's stage timings against the rolling median of
+    the previous builds, its slowest subprocesses, and VSIX size over time.
+    """
+    header("Build Statistics")
+    history = load_history()
+    if not history:
+        info(f"No builds recorded yet in {HISTORY_FILE.name}")
+        info("Run 'python build.py dev' to record one")
+        return
+    
+    latest = history[-1]
+    previous = [r for r in history[:-1] if r.get("ok")][-STATS_WINDOW:]
+    status = f"{C.GREEN}ok{C.END}" if latest.get("ok") else f"{C.RED}failed{C.END}"
+    print(f"  Latest: {C.BOLD}{latest['workflow']}{C.END} v{latest['version']} "
+          f"at {latest['timestamp']} ({status}, {latest['total_seconds']:.1f}s)")
+    print(f"  {C.DIM}Compared with the median of the last {len(previous)} successful build(s){C.END}\n")
+    
+    print(f"  {C.BOLD}{'Stage':<16} {'Latest':>8} {'Median':>8}  Change{C.END}")
+    regressions = 0
+    for name, st in latest["stages"].items():
+        if st["skipped"]:
+            print(f"  {name:<16} {C.DIM}{'skipped':>8}{C.END}")
+            continue
+        runs = [r["stages"][name]["seconds"] for r in previous
+                if name in r["stages"] and not r["stages"][name]["skipped"]]
+        if not runs:
+            print(f"  {name:<16} {st['seconds']:>7.2f}s {C.DIM}{'—':>8}{C.END}")
+            continue
+        median = statistics.median(runs)
+        delta = st["seconds"] - median
+        change = f"{delta:+.2f}s"
+        if st["seconds"] > median * REGRESSION_RATIO and delta > REGRESSION_MIN_SECONDS:
+            change = f"{C.RED}{change} regression{C.END}"
+            regressions += 1
+        elif delta < 0:
+            change = f"{C.GREEN}{change}{C.END}"
+        print(f"  {name:<16} {st['seconds']:>7.2f}s {median:>7.2f}s  {change}")
+    print()
+    
+    commands = sorted(latest.get("commands", []), key=lambda c: c["seconds"], reverse=True)[:5]
+    if commands:
+        print(f"  {C.BOLD}Slowest commands{C.END}")
+        for c in commands:
+            rss = f"{c['peak_rss_mb']:.0f} MB" if c.get("peak_rss_mb") else "—"
+            print(f"    {c['seconds']:>7.2f}s  {rss:>8}  {C.DIM}[{c['stage']}]{C.END} {c['cmd']}")
+        print()
+    
+    sized = [r for r in history if r.get("vsix_bytes")][-STATS_WINDOW:]
+    if sized:
+        print(f"  {C.BOLD}VSIX size{C.END}")
+        last = None
+        for r in sized:
+            mb = r["vsix_bytes"] / (1024 * 1024)
+            delta = f"{C.DIM}{mb - last:+.2f} MB{C.END}" if last is not None else ""
+            print(f"    {r['timestamp']}  v{r['version']:<10} {mb:>7.2f} MB  {delta}")
+            last = mb
+        print()
+    
+    if regressions:
+        warn(f"{regressions} stage(s) regressed against the rolling median")
+    else:
+        success("No stage regressions")
+    print()
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Watch Mode
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+WATCH_DIRS = ["src", "slides-runtime/src", "kernel", "assets"]
+
+# Build outputs copied into the installed extension after each cycle
+SYNC_PATHS = ["out", "kernel", "assets", "slides-runtime/compiled.html"]
+
+# Written by the build itself or by editors; never a reason to rebuild
+WATCH_IGNORE = re.compile(r"(^src/generated/|__pycache__|\.DS_Store$|~$|\.sw[px]$|\.tmp$)")
+
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_INTERVAL = 0.5
+
+def _watch_with_watchdog(changes: queue.Queue) -> bool:
+    """Feed native file events into `changes`. False if watchdog is missing."""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return False
+    
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if not event.is_directory:
+                changes.put(event.src_path)
+    
+    observer = Observer()
+    for d in WATCH_DIRS:
+        if (ROOT / d).exists():
+            observer.schedule(Handler(), str(ROOT / d), recursive=True)
+    observer.daemon = True
+    observer.start()
+    return True
+
+def _watch_by_polling(changes: queue.Queue):
+    """Feed changes found by periodic stat() scans into `changes`."""
+    def snapshot() -> dict:
+        state = {}
+        for d in WATCH_DIRS:
+            for path in (ROOT / d).rglob("*"):
+                try:
+                    if path.is_file():
+                        st = path.stat()
+                        state[str(path)] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    continue
+        return state
+    
+    def poll():
+        before = snapshot()
+        while True:
+            time.sleep(WATCH_POLL_INTERVAL)
+            after = snapshot()
+            for path in before.keys() | after.keys():
+                if before.get(path) != after.get(path):
+                    changes.put(path)
+            before = after
+    
+    threading.Thread(target=poll, daemon=True).start()
+
+def next_change_batch(changes: queue.Queue, debounce: float = WATCH_DEBOUNCE) -> set:
+    """Block for the next change, then collect until edits go quiet."""
+    batch = set()
+    while True:
+        try:
+            path = changes.get(timeout=None if not batch else debounce)
+        except queue.Empty:
+            return batch
+        try:
+            rel = Path(path).resolve().relative_to(ROOT.resolve()).as_posix()
+        except ValueError:
+            continue
+        if not WATCH_IGNORE.search(rel):
+            batch.add(rel)
+
+def sync_to_installed(ext_dir: Path) -> Tuple[list, list]:
+    """
+    Mirror build outputs into the installed extension: copy files that
+    differ, delete files that no longer exist in the source tree. Chunks
+    pruned by build-config.json are treated as absent, as in the .vsix.
+    Returns (copied, removed) relative paths.
+    """
+    pruned = set(prune_patterns(load_build_config()))
+    copied = []
+    removed = []
+    for entry in SYNC_PATHS:
+        src_root = ROOT / entry
+        files = [src_root] if src_root.is_file() else \
+            [f for f in src_root.rglob("*") if f.is_file()] if src_root.is_dir() else []
+        wanted = set()
+        for src in files:
+            rel = src.relative_to(ROOT)
+            if WATCH_IGNORE.search(rel.as_posix()) or rel.as_posix() in pruned:
+                continue
+            wanted.add(rel)
+            dst = ext_dir / rel
+            s_st = src.stat()
+            if dst.exists():
+                d_st = dst.stat()
+                if d_st.st_size == s_st.st_size and d_st.st_mtime_ns == s_st.st_mtime_ns:
+                    continue
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(src, dst)
+            copied.append(rel.as_posix())
+        
+        dst_root = ext_dir / entry
+        if not dst_root.is_dir():
+            continue
+        for dst in sorted(dst_root.rglob("*"), reverse=True):
+            rel = dst.relative_to(ext_dir)
+            if dst.is_file() and rel not in wanted and not WATCH_IGNORE.search(rel.as_posix()):
+                dst.unlink()
+                removed.append(rel.as_posix())
+            elif dst.is_dir() and not any(dst.iterdir()):
+                dst.rmdir()
+    return copied, removed
+
+def workflow_watch():
+    """
+    Watch Mode
+    
+    Builds and installs once if needed, then waits for edits. Each burst of
+    changes runs the compile stages whose inputs changed (see BuildCache)
+    and mirrors out/, kernel/, assets/ and the slides runtime straight into
+    the installed extension (honouring the prune allowlists). Packaging and reinstalling are skipped, so a
+    cycle takes about as long as the compile it actually needs.
+    """
+    global PROFILE
+    header("Watch Mode")
+    print(f"  {C.DIM}Rebuilds what changed and syncs it into the installed extension.{C.END}")
+    print(f"  {C.DIM}Press Ctrl+C to stop.{C.END}\n")
+    
+    with stage("requirements"):
+        check_requirements()
+    print()
+    
+    cache = BuildCache()
+    ext_dir = installed_extension_dir()
+    if not ext_dir.exists():
+        info("Extension not installed yet, doing a full build first")
+        if not run_compile_stages(cache):
+            sys.exit(1)
+        vsix_path = cached_package(cache)
+        if not vsix_path or not cached_install(cache, vsix_path):
+            sys.exit(1)
+        print()
+    
+    changes: queue.Queue = queue.Queue()
+    debounce = WATCH_DEBOUNCE
+    if _watch_with_watchdog(changes):
+        info("Watching with native file events (watchdog)")
+    else:
+        _watch_by_polling(changes)
+        # A burst can straddle two scans; wait at least one more scan
+        debounce = max(WATCH_DEBOUNCE, WATCH_POLL_INTERVAL * 1.5)
+        info(f"Watching by polling every {WATCH_POLL_INTERVAL}s (pip install watchdog for native events)")
+    info(f"Directories: {', '.join(WATCH_DIRS)}")
+    print()
+    
+    try:
+        while True:
+            batch = next_change_batch(changes, debounce)
+            if not batch:
+                continue
+            stamp = datetime.now().strftime("%H:%M:%S")
+            shown = ", ".join(sorted(batch)[:3]) + (f" (+{len(batch) - 3} more)" if len(batch) > 3 else "")
+            step(f"[{stamp}] {len(batch)} change(s): {shown}")
+            
+            PROFILE = BuildProfile("watch")
+            ok = run_compile_stages(cache)
+            if ok:
+                with stage("sync"):
+                    copied, removed = sync_to_installed(ext_dir)
+                success(f"Synced {len(copied)} file(s) to {ext_dir.name}"
+                        + (f", removed {len(removed)}" if removed else ""))
+                changed = copied + removed
+                if any(c.startswith("kernel/") for c in changed):
+                    info("Kernel changed: restart the Python kernel to pick it up")
+                if any(not c.startswith("kernel/") for c in changed):
+                    info("Reload the VS Code window to pick up the changes")
+            else:
+                error("Build failed; waiting for the next change")
+            print_build_timings(PROFILE.to_record(ok))
+            PROFILE = None
+    except KeyboardInterrupt:
+        print()
+        info("Stopped watching")
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # Interactive Menu
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -636,9 +1481,12 @@ def print_help():
     print("COMMANDS:")
     print("  dev        Build and install locally (for development)")
     print("  publish    Bump patch version, build, and publish to VS Code Marketplace")
+    print("  stats      Show build timings, regressions, and VSIX size over time")
+    print("  watch      Rebuild on save and sync into the installed extension")
     print()
     print("OPTIONS:")
-    print("  --clean         Clean build artifacts first")
+    print("  --clean         Clean build artifacts (and build cache) first")
+    print("  --no-cache      Run every build stage, even if its inputs are unchanged")
     print("  --bump TYPE     Override bump type (patch/minor/major, default: patch)")
     print("  --help          Show this help message")
     print()
@@ -647,6 +1495,8 @@ def print_help():
     print("  python build.py dev          # Quick local build and install")
     print("  python build.py dev --clean  # Clean build, then install")
     print("  python build.py publish      # Bump patch version and publish")
+    print("  python build.py stats        # Compare the last build against history")
+    print("  python build.py watch        # Fast edit-reload loop")
     print("  python build.py publish --bump minor  # Bump minor version and publish")
     print()
 
@@ -661,6 +1511,7 @@ def main():
     
     # Parse options
     clean = "--clean" in args
+    use_cache = "--no-cache" not in args
     bump_type = None
     
     if "--bump" in args:
@@ -678,14 +1529,18 @@ def main():
         # No command specified - show interactive menu
         interactive_menu()
     elif command_args[0] == "dev":
-        workflow_dev(clean=clean, bump_type=bump_type)
+        workflow_dev(clean=clean, bump_type=bump_type, use_cache=use_cache)
+    elif command_args[0] == "stats":
+        show_stats()
+    elif command_args[0] == "watch":
+        workflow_watch()
     elif command_args[0] == "publish":
         # Always bump when publishing (default: patch)
         publish_bump = bump_type or "patch"
         workflow_publish(clean=clean, bump_type=publish_bump)
     else:
         error(f"Unknown command: {command_args[0]}")
-        print("  Use 'dev' for local development or 'publish' for marketplace.")
+        print("  Use 'dev' for local development, 'watch' for rebuild-on-save, 'publish' for marketplace, or 'stats' for build history.")
         print("  Run 'python build.py --help' for more information.")
         sys.exit(1)
 
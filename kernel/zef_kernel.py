@@ -6,7 +6,10 @@ A simple Python kernel that executes code cells and returns structured output.
 Communication is via stdin/stdout using JSON messages.
 
 Protocol:
-- Input: JSON object with {"code": "...", "cell_id": "..."}
+- Input: JSON object with {"code": "...", "cell_id": "...", "limits": {...}}
+  where the optional "limits" may set any of
+    "wall_time" (seconds), "cpu_time" (seconds),
+    "memory_mb" (resident set size), "output_bytes" (stdout + stderr)
 - Output: JSON object with {
     "cell_id": "...",
     "status": "ok" | "error",
@@ -15,15 +18,492 @@ Protocol:
     "stderr": "captured stderr", 
     "side_effects": [{"what": "stdout", "content": "..."}, ...],
     "error": {"type": "...", "message": "...", "traceback": "..."} (if status is error)
+    "budget": {"name": "...", "limit": ..., "used": ...} (if a limit was hit)
+    "spilled": {"stdout": {"handle": "...", "bytes": n, "lines": n}, ...} (or null)
+    "iterator": {"handle": "...", "items": [...], "done": bool, ...} (or null)
   }
+- Commands: {"command": "inject_variables", "variables": {...}},
+  {"command": "stats"}, {"command": "memory_report", "limit": 50},
+  {"command": "reclaim", "names": [...], "drop_results": true},
+  {"command": "more", "handle": "...", "count": 20, "limits": {...}}
+  and {"command": "shutdown"}
+- Editor queries, answered even while a cell is running and echoing "id":
+  {"command": "complete" | "signature", "id": ..., "code": "...", "cursor_pos": n}
+  {"command": "read_output", "id": ..., "handle": "...", "lines": [start, end]}
+  (or "bytes": [start, end]; end-exclusive, at most READ_OUTPUT_MAX_BYTES)
+
+Output past ZEF_KERNEL_SPILL_BYTES (default 1 MiB, 0 disables) of one
+stream is spilled to a file on disk: the reply's "stdout"/"stderr" hold only
+the head, "spilled" the handle to page through the rest with read_output.
+Spills live until the same cell_id runs again or the kernel exits.
+
+Autoreload: before each cell, imported user modules (anything outside the
+standard library and site-packages) whose source changed are reloaded in
+dependency order, and their functions and classes patched in place (see
+ModuleReloader). The reply's "autoreload" lists what happened, or is null.
+ZEF_KERNEL_AUTORELOAD=0 turns it off.
+
+Lazy results: when a cell's last expression is an iterator (a generator,
+map, zip, ...) or a range longer than one batch, nothing is materialized.
+Only the first LAZY_BATCH items are pulled and sent under "iterator"; the
+iterator stays alive under its handle and "more" pulls the next batch, in
+the main thread and under the given limits like a cell. An iterator the
+last expression only refers to (`reader`, `self.rows`, `its[0]`) is
+repr()'d instead: it is bound elsewhere, and pulling a batch would consume
+items the code holding it expects to see.
+
+When a limit is hit the cell is interrupted inside the kernel and the reply
+carries everything captured up to that point. The namespace survives.
+
+Startup: ZEF_KERNEL_PROFILE may name a JSON profile listing modules to
+preload and a matplotlib backend (see load_startup_profile). The ready
+message reports startup timings under "startup".
+
+Tracing: ZEF_KERNEL_TRACE may name a file to record the session's protocol
+traffic into (see SessionRecorder); zef_replay.py plays it back.
 """
 
+import time
+
+# Taken before the remaining imports so startup timing includes them
+_MODULE_START = time.perf_counter()
+
 import sys
+import os
 import json
+import gc
+import signal
+import threading
 import traceback
 import io
+import re
+import builtins
+import types
+import queue
+import itertools
+import collections.abc
+from array import array
 from contextlib import redirect_stdout, redirect_stderr
-from code import InteractiveInterpreter
+from typing import Optional
+
+
+class BudgetExceeded(BaseException):
+    """
+    Raised inside a running cell when one of its limits is hit.
+
+    Derives from BaseException (like KeyboardInterrupt) so that a bare
+    `except Exception` in user code does not swallow it.
+    """
+
+
+def current_rss() -> Optional[int]:
+    """Return the resident set size of this process in bytes, if known."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def _buffer_nbytes(obj) -> Optional[int]:
+    """
+    Size of the data buffer behind array-like objects, without importing
+    their libraries. Only trusted types are asked, so no user properties run.
+    """
+    module = type(obj).__module__ or ""
+    if module.startswith("numpy") and hasattr(type(obj), "nbytes"):
+        return int(obj.nbytes)
+    if module.startswith("pandas") and hasattr(type(obj), "memory_usage"):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if module.startswith(("torch", "jax", "cupy")) and hasattr(type(obj), "nbytes"):
+        return int(obj.nbytes)
+    return None
+
+
+# Objects one memory_report may visit in total, across all entries
+MEMORY_REPORT_MAX_OBJECTS = 5_000_000
+
+# Leaf values sized inline as their container is walked, never stacked
+_ATOMIC_TYPES = frozenset((int, float, complex, bool, str, bytes, type(None)))
+
+
+def deep_sizeof(obj, seen: set, max_objects: int = MEMORY_REPORT_MAX_OBJECTS) -> tuple:
+    """
+    Estimate the bytes reachable from `obj`, skipping ids already in `seen`.
+
+    Follows containers, instance __dict__ and __slots__, and uses buffer
+    sizes for arrays and frames. Returns (bytes, complete) where complete
+    is False if the walk stopped after max_objects. Every object visited
+    is added to `seen`, so len(seen) tells a caller how much budget is left.
+    """
+    total = 0
+    visited = 0
+    stack = [obj]
+    getsizeof = sys.getsizeof
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        # Modules, classes and functions are shared code, not session data
+        if isinstance(o, (types.ModuleType, type, types.FunctionType,
+                          types.BuiltinFunctionType, types.MethodType)):
+            continue
+        seen.add(id(o))
+        visited += 1
+        if visited > max_objects:
+            return total, False
+        try:
+            nbytes = _buffer_nbytes(o)
+        except Exception:
+            nbytes = None
+        if nbytes is not None:
+            total += nbytes
+            continue
+        total += getsizeof(o, 0)
+        if isinstance(o, dict):
+            children = itertools.chain(o.keys(), o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            children = o
+        else:
+            d = getattr(o, "__dict__", None) if not isinstance(o, (str, bytes, bytearray)) else None
+            if isinstance(d, dict):
+                stack.append(d)
+            for slot in getattr(type(o), "__slots__", ()):
+                if isinstance(slot, str) and hasattr(o, slot):
+                    stack.append(getattr(o, slot))
+            continue
+        # Big containers are mostly numbers and strings: size those here
+        # instead of a stack round trip each
+        for child in children:
+            if type(child) in _ATOMIC_TYPES:
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    visited += 1
+                    total += getsizeof(child, 0)
+            else:
+                stack.append(child)
+        if visited > max_objects:
+            return total, False
+    return total, True
+
+
+def malloc_trim() -> bool:
+    """Return freed heap pages to the OS (glibc only). True if it ran."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import ctypes
+        libc = ctypes.CDLL("libc.so.6")
+        libc.malloc_trim(0)
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+class CellBudget:
+    """
+    Enforces per-cell limits while a cell runs.
+
+    Wall and CPU time use interval timers (SIGALRM / SIGPROF) where the
+    platform has them, so even blocking calls like time.sleep() are
+    interrupted. Memory is watched by a polling thread that raises
+    BudgetExceeded in the main thread. Output size is charged by the
+    SideEffectCapture streams as they are written to.
+    """
+
+    POLL_INTERVAL = 0.05
+    # Re-fire interval in case user code catches the first BudgetExceeded
+    REARM_INTERVAL = 0.5
+
+    def __init__(self, limits: Optional[dict] = None):
+        limits = limits or {}
+        self.wall_time = limits.get("wall_time")
+        self.cpu_time = limits.get("cpu_time")
+        self.memory_bytes = (
+            int(limits["memory_mb"] * 1024 * 1024) if limits.get("memory_mb") else None
+        )
+        self.output_bytes = limits.get("output_bytes")
+        self.output_used = 0
+        self.tripped: Optional[dict] = None
+        self._active = False
+        self._use_timers = hasattr(signal, "setitimer")
+        self._old_handlers: dict = {}
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._main_ident = threading.main_thread().ident
+
+    def __enter__(self):
+        self._start_wall = time.monotonic()
+        self._start_cpu = time.process_time()
+        self._active = True
+        on_main = threading.get_ident() == self._main_ident
+
+        if self._use_timers and on_main:
+            if self.wall_time:
+                self._arm(signal.SIGALRM, signal.ITIMER_REAL, self.wall_time, "wall_time")
+            if self.cpu_time:
+                self._arm(signal.SIGPROF, signal.ITIMER_PROF, self.cpu_time, "cpu_time")
+        else:
+            self._use_timers = False
+
+        if self.memory_bytes or (not self._use_timers and (self.wall_time or self.cpu_time)):
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, daemon=True)
+            self._watchdog.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        """Disarm timers and stop the watchdog. Safe to call more than once."""
+        self._active = False
+        if self._use_timers:
+            for which in (signal.ITIMER_REAL, signal.ITIMER_PROF):
+                signal.setitimer(which, 0)
+            for signum, handler in self._old_handlers.items():
+                signal.signal(signum, handler)
+            self._old_handlers.clear()
+        if self._watchdog is not None:
+            self._stop.set()
+            self._watchdog.join()
+            self._watchdog = None
+            # Clear an async exception that was queued just before we stopped
+            import ctypes
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self._main_ident), None)
+
+    def _arm(self, signum, which, seconds: float, name: str):
+        def handler(_signum, _frame):
+            if self._active:
+                self._trip(name)
+                raise BudgetExceeded(name)
+        self._old_handlers[signum] = signal.signal(signum, handler)
+        signal.setitimer(which, seconds, self.REARM_INTERVAL)
+
+    def _used(self, name: str):
+        if name == "wall_time":
+            return round(time.monotonic() - self._start_wall, 3)
+        if name == "cpu_time":
+            return round(time.process_time() - self._start_cpu, 3)
+        if name == "memory_mb":
+            rss = current_rss()
+            return round(rss / (1024 * 1024), 1) if rss is not None else None
+        if name == "output_bytes":
+            return self.output_used
+        return None
+
+    def _trip(self, name: str):
+        # Keep the first budget that tripped; re-fires report the same one
+        if self.tripped is None:
+            limit = {
+                "wall_time": self.wall_time,
+                "cpu_time": self.cpu_time,
+                "memory_mb": self.memory_bytes and self.memory_bytes / (1024 * 1024),
+                "output_bytes": self.output_bytes,
+            }[name]
+            self.tripped = {"name": name, "limit": limit, "used": self._used(name)}
+
+    def _watch(self):
+        """Polling fallback: memory everywhere, time where timers are missing."""
+        import ctypes
+        last_fire = 0.0
+        while not self._stop.wait(self.POLL_INTERVAL):
+            name = None
+            if self.memory_bytes:
+                rss = current_rss()
+                if rss is not None and rss > self.memory_bytes:
+                    name = "memory_mb"
+            if name is None and not self._use_timers:
+                if self.wall_time and time.monotonic() - self._start_wall > self.wall_time:
+                    name = "wall_time"
+                elif self.cpu_time and time.process_time() - self._start_cpu > self.cpu_time:
+                    name = "cpu_time"
+            now = time.monotonic()
+            if name is None or not self._active or now - last_fire < self.REARM_INTERVAL:
+                continue
+            last_fire = now
+            self._trip(name)
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_ulong(self._main_ident), ctypes.py_object(BudgetExceeded)
+            )
+
+    def charge_output(self, s: str) -> str:
+        """
+        Account for text about to be written to stdout/stderr.
+        Returns the part of `s` that still fits the budget.
+        """
+        if not self.output_bytes or not self._active:
+            return s
+        remaining = self.output_bytes - self.output_used
+        size = len(s.encode('utf-8', 'replace'))
+        if size <= remaining:
+            self.output_used += size
+            return s
+        fitting = s.encode('utf-8', 'replace')[:max(remaining, 0)].decode('utf-8', 'ignore')
+        self.output_used += len(fitting.encode('utf-8'))
+        return fitting
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": {str(b): c for b, c in zip(self.buckets, self.counts)},
+        }
+
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)
+SIZE_BUCKETS = (256, 4096, 65536, 1 << 20, 16 << 20, 256 << 20)
+
+
+class KernelMetrics:
+    """
+    Counters, histograms and gauges describing kernel behaviour.
+
+    Returned by the "stats" command. If ZEF_KERNEL_METRICS_FILE is set the
+    snapshot is also written there after every command, as Prometheus text
+    when the file name ends in ".prom" and as JSON otherwise.
+    """
+
+    PHASES = ("reload", "execute", "repr", "figures", "serialize")
+
+    def __init__(self, dump_path: Optional[str] = None):
+        self.started = time.time()
+        self.dump_path = dump_path
+        self.executions = {"ok": 0, "error": 0, "budget_exceeded": 0}
+        self.commands: dict = {}
+        self.phase_latency = {phase: Histogram(LATENCY_BUCKETS) for phase in self.PHASES}
+        self.reply_bytes = Histogram(SIZE_BUCKETS)
+        self.figures_total = 0
+        self.figure_render_seconds = Histogram(LATENCY_BUCKETS)
+        self.inject_bytes = Histogram(SIZE_BUCKETS)
+        self.startup: dict = {}
+        self.preloader: Optional["Preloader"] = None
+
+    def count_command(self, command: str):
+        self.commands[command] = self.commands.get(command, 0) + 1
+
+    def record_execution(self, result: dict, phases: dict):
+        if result.get("budget"):
+            self.executions["budget_exceeded"] += 1
+        else:
+            self.executions[result.get("status", "error")] = (
+                self.executions.get(result.get("status", "error"), 0) + 1
+            )
+        for phase, seconds in phases.items():
+            self.phase_latency[phase].observe(seconds)
+        if result.get("figures"):
+            self.figures_total += len(result["figures"])
+            self.figure_render_seconds.observe(phases.get("figures", 0.0))
+
+    def snapshot(self, namespace: dict) -> dict:
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "startup": dict(
+                self.startup,
+                **({"preload": self.preloader.report()} if self.preloader else {})
+            ),
+            "executions": dict(self.executions),
+            "commands": dict(self.commands),
+            "phase_latency_seconds": {
+                phase: hist.to_dict() for phase, hist in self.phase_latency.items()
+            },
+            "reply_bytes": self.reply_bytes.to_dict(),
+            "figures_total": self.figures_total,
+            "figure_render_seconds": self.figure_render_seconds.to_dict(),
+            "inject_variables_bytes": self.inject_bytes.to_dict(),
+            "rss_bytes": current_rss(),
+            "namespace_objects": len(namespace),
+            "gc": {
+                "counts": list(gc.get_count()),
+                "generations": gc.get_stats(),
+            },
+        }
+
+    def to_prometheus(self, snap: dict) -> str:
+        lines = []
+
+        def hist(name: str, data: dict, labels: str = ""):
+            sep = "," if labels else ""
+            for bound, count in data["buckets"].items():
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {data["count"]}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {data['sum']}")
+            lines.append(f"{name}_count{suffix} {data['count']}")
+
+        lines.append("# TYPE zef_kernel_uptime_seconds gauge")
+        lines.append(f"zef_kernel_uptime_seconds {snap['uptime_seconds']}")
+        lines.append("# TYPE zef_kernel_executions_total counter")
+        for status, n in snap["executions"].items():
+            lines.append(f'zef_kernel_executions_total{{status="{status}"}} {n}')
+        lines.append("# TYPE zef_kernel_commands_total counter")
+        for command, n in snap["commands"].items():
+            lines.append(f'zef_kernel_commands_total{{command="{command}"}} {n}')
+        lines.append("# TYPE zef_kernel_phase_latency_seconds histogram")
+        for phase, data in snap["phase_latency_seconds"].items():
+            hist("zef_kernel_phase_latency_seconds", data, f'phase="{phase}"')
+        lines.append("# TYPE zef_kernel_reply_bytes histogram")
+        hist("zef_kernel_reply_bytes", snap["reply_bytes"])
+        lines.append("# TYPE zef_kernel_figures_total counter")
+        lines.append(f"zef_kernel_figures_total {snap['figures_total']}")
+        lines.append("# TYPE zef_kernel_figure_render_seconds histogram")
+        hist("zef_kernel_figure_render_seconds", snap["figure_render_seconds"])
+        lines.append("# TYPE zef_kernel_inject_variables_bytes histogram")
+        hist("zef_kernel_inject_variables_bytes", snap["inject_variables_bytes"])
+        if snap["rss_bytes"] is not None:
+            lines.append("# TYPE zef_kernel_rss_bytes gauge")
+            lines.append(f"zef_kernel_rss_bytes {snap['rss_bytes']}")
+        lines.append("# TYPE zef_kernel_namespace_objects gauge")
+        lines.append(f"zef_kernel_namespace_objects {snap['namespace_objects']}")
+        lines.append("# TYPE zef_kernel_gc_collections_total counter")
+        for gen, stats in enumerate(snap["gc"]["generations"]):
+            lines.append(f'zef_kernel_gc_collections_total{{generation="{gen}"}} {stats["collections"]}')
+        lines.append("# TYPE zef_kernel_gc_collected_total counter")
+        for gen, stats in enumerate(snap["gc"]["generations"]):
+            lines.append(f'zef_kernel_gc_collected_total{{generation="{gen}"}} {stats["collected"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, namespace: dict):
+        """Atomically rewrite the metrics file, if one is configured."""
+        if not self.dump_path:
+            return
+        snap = self.snapshot(namespace)
+        if self.dump_path.endswith(".prom"):
+            text = self.to_prometheus(snap)
+        else:
+            text = json.dumps(snap, indent=2)
+        tmp_path = self.dump_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(text)
+            os.replace(tmp_path, self.dump_path)
+        except OSError:
+            # Metrics are best effort; never let them break a cell
+            pass
 
 
 class SideEffectCapture(io.StringIO):
@@ -31,12 +511,35 @@ class SideEffectCapture(io.StringIO):
     A StringIO-like object that captures each write as a separate side effect.
     This allows us to track individual print() calls rather than just the final output.
     """
-    def __init__(self, effect_type: str):
+    def __init__(self, effect_type: str, budget: Optional[CellBudget] = None,
+                 store: Optional["OutputStore"] = None, cell_id: str = ""):
         super().__init__()
         self.effect_type = effect_type
         self.effects: list = []
+        self.budget = budget
+        self.store = store
+        self.cell_id = cell_id
+        self.size = 0
+        # Set once output outgrows the store's threshold; everything goes there after
+        self.spill: Optional[SpilledOutput] = None
         
     def write(self, s: str) -> int:
+        over_budget = False
+        if self.budget is not None:
+            fitting = self.budget.charge_output(s)
+            over_budget = len(fitting) < len(s)
+            s = fitting
+        if self.spill is None and self.store is not None and self.store.threshold:
+            self.size += len(s.encode('utf-8', 'replace'))
+            if self.size > self.store.threshold:
+                self.spill = self.store.create(self.cell_id, self.effect_type)
+                self.spill.write(self.getvalue())
+        if self.spill is not None:
+            self.spill.write(s)
+            if over_budget:
+                self.budget._trip("output_bytes")
+                raise BudgetExceeded("output_bytes")
+            return len(s)
         # Don't capture empty strings or pure newlines between prints
         if s and s != '\n':
             # Strip trailing newline that print() adds
@@ -47,20 +550,1078 @@ class SideEffectCapture(io.StringIO):
                     "content": s  # Keep the original with newline
                 })
         # Also write to underlying StringIO for backwards compatibility
-        return super().write(s)
+        written = super().write(s)
+        if over_budget:
+            self.budget._trip("output_bytes")
+            raise BudgetExceeded("output_bytes")
+        return written
     
     def get_effects(self) -> list:
         return self.effects
 
 
+READ_OUTPUT_MAX_BYTES = 4 * 1024 * 1024
+
+
+class SpilledOutput:
+    """
+    One stream of one cell, spilled to an append-only file. While writing it
+    keeps a sparse line index: the byte offset of every INDEX_STRIDE-th line,
+    so reading any line range is one seek plus at most a stride of scanning,
+    and memory stays small however long the output gets.
+    """
+    INDEX_STRIDE = 256
+
+    def __init__(self, handle: str, path: str):
+        self.handle = handle
+        self.path = path
+        self.bytes = 0
+        self.newlines = 0
+        self._last_byte = b"\n"
+        self._checkpoints = array("Q", [0])
+        self._file = open(path, "wb")
+        # read_output runs on the reader thread while the cell may still write
+        self._lock = threading.Lock()
+
+    def write(self, s: str):
+        data = s.encode("utf-8", "replace")
+        if not data:
+            return
+        with self._lock:
+            count = data.count(b"\n")
+            if self.newlines % self.INDEX_STRIDE + count >= self.INDEX_STRIDE:
+                pos = -1
+                for i in range(1, count + 1):
+                    pos = data.find(b"\n", pos + 1)
+                    if (self.newlines + i) % self.INDEX_STRIDE == 0:
+                        self._checkpoints.append(self.bytes + pos + 1)
+            self._file.write(data)
+            self.bytes += len(data)
+            self.newlines += count
+            self._last_byte = data[-1:]
+
+    @property
+    def lines(self) -> int:
+        return self.newlines + (self._last_byte != b"\n")
+
+    def finish(self):
+        """The cell is done; close the writer."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def info(self) -> dict:
+        return {"handle": self.handle, "bytes": self.bytes, "lines": self.lines}
+
+    def _flush(self):
+        if not self._file.closed:
+            self._file.flush()
+
+    def read_bytes(self, start: int, end: Optional[int] = None) -> dict:
+        with self._lock:
+            self._flush()
+            total = self.bytes
+        start = min(max(start, 0), total)
+        end = total if end is None else min(max(end, start), total)
+        end = min(end, start + READ_OUTPUT_MAX_BYTES)
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return {"bytes": [start, end], "content": data.decode("utf-8", "replace")}
+
+    def read_lines(self, start: int, end: Optional[int] = None) -> dict:
+        """
+        Lines [start, end), at most READ_OUTPUT_MAX_BYTES of them. A single
+        line longer than that comes back cut, with "partial" set.
+        """
+        with self._lock:
+            self._flush()
+            total_bytes, total_lines = self.bytes, self.lines
+            start = min(max(start, 0), total_lines)
+            stride_index = min(start // self.INDEX_STRIDE, len(self._checkpoints) - 1)
+            offset = self._checkpoints[stride_index]
+        end = total_lines if end is None else min(max(end, start), total_lines)
+        chunks = []
+        size = 0
+        partial = False
+        line = stride_index * self.INDEX_STRIDE
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while line < start:
+                # In bounded pieces, so a huge line never sits in memory
+                while not f.readline(READ_OUTPUT_MAX_BYTES).endswith(b"\n") and f.tell() < total_bytes:
+                    pass
+                line += 1
+            first_byte = f.tell()
+            while line < end and size < READ_OUTPUT_MAX_BYTES:
+                chunk = f.readline(READ_OUTPUT_MAX_BYTES - size)
+                if not chunk:
+                    break
+                if not chunk.endswith(b"\n") and f.tell() < total_bytes:
+                    # Cut by the size cap: only keep it if it's all we have
+                    if not chunks:
+                        chunks.append(chunk)
+                        partial = True
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+                line += 1
+        data = b"".join(chunks)
+        return {
+            "lines": [start, line],
+            "bytes": [first_byte, first_byte + len(data)],
+            "partial": partial,
+            "content": data.decode("utf-8", "replace"),
+        }
+
+
+DEFAULT_SPILL_BYTES = 1024 * 1024
+
+
+def spill_threshold(value: Optional[str]) -> int:
+    """
+    Parse ZEF_KERNEL_SPILL_BYTES. Unset means DEFAULT_SPILL_BYTES; a value
+    that isn't a non-negative integer is reported and ignored the same way.
+    """
+    if value is None:
+        return DEFAULT_SPILL_BYTES
+    try:
+        threshold = int(value)
+    except ValueError:
+        threshold = -1
+    if threshold < 0:
+        print(f"Ignoring ZEF_KERNEL_SPILL_BYTES={value!r}: not a byte count", file=sys.stderr)
+        return DEFAULT_SPILL_BYTES
+    return threshold
+
+
+class OutputStore:
+    """
+    Spilled cell output, one file per cell and stream in a private temporary
+    directory. `threshold` is how many bytes a stream may reach in memory
+    before the rest goes to disk (0 disables spilling).
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self._dir: Optional[str] = None
+        self._spills: dict = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def create(self, cell_id: str, stream: str) -> SpilledOutput:
+        with self._lock:
+            if self._dir is None:
+                import tempfile
+                self._dir = tempfile.mkdtemp(prefix="zef-output-")
+            self._counter += 1
+            safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", cell_id)[:40] or "cell"
+            handle = f"{safe_id}-{self._counter}-{stream}"
+            spill = SpilledOutput(handle, os.path.join(self._dir, handle))
+            self._spills[handle] = (cell_id, spill)
+        return spill
+
+    def get(self, handle: str) -> SpilledOutput:
+        with self._lock:
+            entry = self._spills.get(handle)
+        if entry is None:
+            raise ValueError(f"Unknown or released output handle: {handle}")
+        return entry[1]
+
+    def release_cell(self, cell_id: str):
+        """Drop the spills of a previous run of `cell_id`."""
+        with self._lock:
+            handles = [h for h, (cid, _) in self._spills.items() if cid == cell_id]
+            spills = [self._spills.pop(h)[1] for h in handles]
+        for spill in spills:
+            spill.finish()
+            try:
+                os.remove(spill.path)
+            except OSError:
+                pass
+
+    def close(self):
+        with self._lock:
+            spills = [spill for _, spill in self._spills.values()]
+            self._spills.clear()
+            directory, self._dir = self._dir, None
+        for spill in spills:
+            spill.finish()
+        if directory is not None:
+            import shutil
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class CompletionIndex:
+    """
+    Attribute and signature index over the live namespace.
+
+    Everything is looked up with inspect.getattr_static, so properties,
+    __getattr__ and __dir__ are never run: completing an attribute chain
+    cannot execute user code. Results are cached per top-level name and
+    dropped when the name is rebound or mentioned by a cell (which may have
+    mutated it), so repeated keystrokes on a large object are dictionary hits.
+    """
+
+    _CHAIN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\s*\.\s*[A-Za-z_][A-Za-z0-9_]*)*\s*\.?\s*$|$")
+    _MAX_MATCHES = 200
+    # Only this much text before the cursor is ever looked at, so a long
+    # literal in the cell can't make a keystroke slow
+    _MAX_CHAIN_CHARS = 200
+    _MAX_CALL_LINES = 16
+    _MAX_CALL_CHARS = 4000
+
+    def __init__(self, namespace: dict):
+        self.namespace = namespace
+        # root name -> {"id": id(value), "attrs": {path: [...]}, "sigs": {path: {...}}}
+        self._cache: dict = {}
+
+    def invalidate(self, names):
+        for name in names:
+            self._cache.pop(name, None)
+
+    def _entry(self, root: str):
+        value = self.namespace.get(root, _MISSING)
+        if value is _MISSING:
+            value = getattr(builtins, root, _MISSING)
+        if value is _MISSING:
+            return None, None
+        entry = self._cache.get(root)
+        if entry is None or entry["id"] != id(value):
+            entry = self._cache[root] = {"id": id(value), "attrs": {}, "sigs": {}}
+        return value, entry
+
+    def _resolve(self, parts: list):
+        """Follow an attribute chain statically. Returns (object, entry) or (_MISSING, None)."""
+        import inspect
+        obj, entry = self._entry(parts[0])
+        if entry is None:
+            return _MISSING, None
+        for attr in parts[1:]:
+            try:
+                obj = inspect.getattr_static(obj, attr)
+            except AttributeError:
+                return _MISSING, None
+            if isinstance(obj, (staticmethod, classmethod)):
+                obj = obj.__func__
+            elif _is_dynamic_descriptor(obj):
+                # Its value only exists by running code; stop here
+                return _MISSING, None
+        return obj, entry
+
+    @staticmethod
+    def _attribute_names(obj) -> list:
+        names = set()
+        for klass in _static_mro(obj if isinstance(obj, type) else type(obj)):
+            names.update(_static_dict(klass))
+        if not isinstance(obj, type):
+            names.update(_static_dict(obj))
+        return sorted(names)
+
+    @staticmethod
+    def _kind(obj) -> str:
+        if isinstance(obj, type):
+            return "class"
+        if isinstance(obj, types.ModuleType):
+            return "module"
+        if isinstance(obj, (types.FunctionType, types.BuiltinFunctionType,
+                            types.MethodDescriptorType, types.WrapperDescriptorType)):
+            return "function"
+        if _is_dynamic_descriptor(obj):
+            return "property"
+        return "variable"
+
+    def complete(self, code: str, cursor_pos: Optional[int] = None) -> dict:
+        """Complete the dotted name that ends at cursor_pos."""
+        import inspect
+        import keyword
+        if cursor_pos is None:
+            cursor_pos = len(code)
+        chain = self._chain_before(code[:cursor_pos])
+        if chain is None:
+            return {"matches": [], "cursor_start": cursor_pos, "cursor_end": cursor_pos}
+        parts = chain.split(".")
+        prefix = parts[-1]
+        cursor_start = cursor_pos - len(prefix)
+        matches = []
+
+        if len(parts) == 1:
+            candidates = set(self.namespace) | set(dir(builtins)) | set(keyword.kwlist)
+            for name in sorted(candidates):
+                if name.startswith(prefix):
+                    value = self.namespace.get(name, getattr(builtins, name, None))
+                    kind = "keyword" if keyword.iskeyword(name) else self._kind(value)
+                    matches.append({"name": name, "kind": kind})
+                    if len(matches) >= self._MAX_MATCHES:
+                        break
+        else:
+            path = ".".join(parts[:-1])
+            obj, entry = self._resolve(parts[:-1])
+            if entry is not None:
+                attrs = entry["attrs"].get(path)
+                if attrs is None:
+                    attrs = []
+                    for name in self._attribute_names(obj):
+                        try:
+                            value = inspect.getattr_static(obj, name)
+                        except AttributeError:
+                            continue
+                        attrs.append({"name": name, "kind": self._kind(value)})
+                    entry["attrs"][path] = attrs
+                # Hide private names until the user types an underscore
+                show_private = prefix.startswith("_")
+                matches = [
+                    a for a in attrs
+                    if a["name"].startswith(prefix) and (show_private or not a["name"].startswith("_"))
+                ][:self._MAX_MATCHES]
+
+        return {"matches": matches, "cursor_start": cursor_start, "cursor_end": cursor_pos}
+
+    @classmethod
+    def _chain_before(cls, text: str) -> Optional[str]:
+        """
+        The dotted name ending where `text` ends, with whitespace removed.
+        None if it runs back further than _MAX_CHAIN_CHARS.
+        """
+        limit = max(len(text) - cls._MAX_CHAIN_CHARS, 0)
+        start = len(text)
+        while start > limit and (text[start - 1].isalnum() or text[start - 1] in "_. \t\r\n"):
+            start -= 1
+        if start == limit and limit > 0 and (text[start - 1].isalnum() or text[start - 1] == "_"):
+            # The run goes on past the window: no sensible name to complete
+            return None
+        match = cls._CHAIN.search(text, start)
+        return re.sub(r"\s+", "", match.group(0)) if match else ""
+
+    @classmethod
+    def _open_call(cls, text: str) -> Optional[tuple]:
+        """
+        (callee chain, active parameter) for the innermost call still open
+        where `text` ends, or None. Tokenizes only the last few lines, widening
+        the window until the call's opening line is inside it, so brackets and
+        commas inside string literals are ignored.
+        """
+        import tokenize
+        line_start = text.rfind("\n", 0, len(text)) + 1
+        lines = 1
+        while True:
+            window = text[line_start:]
+            opened = []  # [token, comma count] per unclosed bracket
+            unmatched_close = False
+            tokens = []
+            try:
+                for tok in tokenize.generate_tokens(io.StringIO(window).readline):
+                    tokens.append(tok)
+                    if tok.type != tokenize.OP:
+                        continue
+                    if tok.string in "([{":
+                        opened.append([len(tokens) - 1, 0])
+                    elif tok.string in ")]}":
+                        if opened:
+                            opened.pop()
+                        else:
+                            unmatched_close = True
+                    elif tok.string == "," and opened:
+                        opened[-1][1] += 1
+            except (tokenize.TokenError, SyntaxError):
+                # Input ends inside the call (or a string): use what we have
+                pass
+            if opened and not unmatched_close:
+                index, commas = opened[-1]
+                if tokens[index].string != "(":
+                    return None
+                parts = []
+                i = index - 1
+                while i >= 0 and tokens[i].type == tokenize.NAME:
+                    parts.insert(0, tokens[i].string)
+                    if i >= 1 and tokens[i - 1].string == ".":
+                        i -= 2
+                    else:
+                        break
+                if parts:
+                    return ".".join(parts), commas
+                if index > 0:
+                    # A bracket but not a call, e.g. a parenthesized expression
+                    return None
+            if line_start == 0 or lines >= cls._MAX_CALL_LINES \
+                    or len(text) - line_start >= cls._MAX_CALL_CHARS:
+                return None
+            # Take in twice as many lines before the cursor
+            for _ in range(lines):
+                if line_start == 0:
+                    break
+                line_start = text.rfind("\n", 0, line_start - 1) + 1
+            lines *= 2
+
+    def signature(self, code: str, cursor_pos: Optional[int] = None) -> dict:
+        """Signature help for the innermost open call around cursor_pos."""
+        if cursor_pos is None:
+            cursor_pos = len(code)
+        call = self._open_call(code[:cursor_pos])
+        if call is None:
+            return {"signature": None}
+        chain, active_param = call
+        parts = chain.split(".")
+        obj, entry = self._resolve(parts)
+        if entry is None:
+            return {"signature": None}
+
+        cached = entry["sigs"].get(chain)
+        if cached is None:
+            # A plain function reached through an instance is a bound method
+            bound = False
+            if len(parts) > 1 and isinstance(obj, types.FunctionType):
+                owner, _ = self._resolve(parts[:-1])
+                bound = not isinstance(owner, (type, types.ModuleType)) \
+                    and parts[-1] not in _static_dict(owner)
+            cached = entry["sigs"][chain] = _static_signature(obj, parts[-1], bound)
+        if cached is None:
+            return {"signature": None}
+        return {"signature": dict(cached, active_parameter=active_param)}
+
+
+_MISSING = object()
+
+
+def _static_mro(klass: type) -> tuple:
+    try:
+        return type.__dict__["__mro__"].__get__(klass)
+    except (KeyError, TypeError):
+        return (klass,)
+
+
+def _static_dict(obj) -> dict:
+    """obj.__dict__ without triggering a user-defined __dict__ or __getattribute__."""
+    try:
+        d = object.__getattribute__(obj, "__dict__") if not isinstance(obj, type) \
+            else type.__dict__["__dict__"].__get__(obj)
+    except (AttributeError, TypeError):
+        return {}
+    return d if isinstance(d, (dict, types.MappingProxyType)) else {}
+
+
+def _is_dynamic_descriptor(obj) -> bool:
+    """True for descriptors whose value is computed on access (property & co)."""
+    if isinstance(obj, (types.FunctionType, type, types.BuiltinFunctionType,
+                        types.MethodDescriptorType, types.WrapperDescriptorType,
+                        types.ClassMethodDescriptorType)):
+        return False
+    return isinstance(obj, (property, types.GetSetDescriptorType, types.MemberDescriptorType)) \
+        or hasattr(type(obj), "__get__")
+
+
+def _static_signature(obj, name: str, bound: bool = False) -> Optional[dict]:
+    """Signature of a function or class found statically; None for anything else."""
+    import inspect
+    target = obj
+    if not isinstance(obj, (type, types.FunctionType, types.BuiltinFunctionType,
+                            types.MethodDescriptorType, types.WrapperDescriptorType,
+                            types.MethodType)):
+        # Callable instances: describe type(obj).__call__ if it is a plain function
+        call = _static_dict(type(obj)).get("__call__")
+        if not isinstance(call, types.FunctionType):
+            return None
+        target = call
+    try:
+        sig = inspect.signature(target)
+    except (TypeError, ValueError):
+        return None
+    if bound or target is not obj:
+        sig = sig.replace(parameters=list(sig.parameters.values())[1:])
+    doc = _static_dict(target).get("__doc__") if isinstance(target, type) else \
+        getattr(target, "__doc__", None)
+    return {
+        "label": f"{name}{sig}",
+        "parameters": [str(p) for p in sig.parameters.values()],
+        "doc": inspect.cleandoc(doc).split("\n\n")[0] if isinstance(doc, str) else None,
+    }
+
+
+class Preloader:
+    """
+    Imports the modules named by a startup profile.
+
+    Entries are module names, optionally with an alias ("numpy as np");
+    aliased modules are bound in the namespace. In background mode the
+    imports run on a thread after the ready message has gone out, and a
+    cell that mentions a module still being loaded waits for it.
+    """
+
+    def __init__(self, namespace: dict, entries: list):
+        self.namespace = namespace
+        self.entries = []
+        for entry in entries:
+            module, _, alias = (part.strip() for part in entry.partition(" as "))
+            self.entries.append((module, alias or None))
+        self.timings_ms: dict = {}
+        self.errors: dict = {}
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Whole-word names a cell could use to reach a preloaded module
+        names = {alias or module.split(".")[0] for module, alias in self.entries}
+        self._mentions = re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b") if names else None
+
+    def run(self):
+        import importlib
+        for module, alias in self.entries:
+            t0 = time.perf_counter()
+            try:
+                imported = importlib.import_module(module)
+            except Exception as e:
+                self.errors[module] = f"{type(e).__name__}: {e}"
+                continue
+            finally:
+                self.timings_ms[module] = round((time.perf_counter() - t0) * 1000, 2)
+            if alias:
+                self.namespace[alias] = imported
+        self._done.set()
+
+    def start_background(self):
+        self._thread = threading.Thread(target=self.run, daemon=True, name="zef-preload")
+        self._thread.start()
+
+    def wait_for(self, code: str):
+        """Block until preloading finishes if `code` mentions a preloaded name."""
+        if self._done.is_set() or self._mentions is None:
+            return
+        if self._mentions.search(code):
+            self._done.wait()
+
+    def report(self) -> dict:
+        return {
+            "done": self._done.is_set(),
+            "timings_ms": dict(self.timings_ms),
+            "errors": dict(self.errors),
+        }
+
+
+def load_startup_profile(path: Optional[str]) -> dict:
+    """
+    Read the JSON startup profile named by ZEF_KERNEL_PROFILE:
+        {"preload": ["numpy as np", "pandas as pd"],
+         "background": true,
+         "matplotlib_backend": "Agg"}
+    A missing or unreadable profile means no preloading.
+    """
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring startup profile {path}: {e}", file=sys.stderr)
+        return {}
+    return profile if isinstance(profile, dict) else {}
+
+
+def _library_roots() -> tuple:
+    """Directories whose modules are never user code."""
+    import sysconfig
+    roots = {os.path.dirname(os.path.realpath(__file__))}
+    paths = sysconfig.get_paths()
+    for key in ("stdlib", "platstdlib", "purelib", "platlib"):
+        if paths.get(key):
+            roots.add(os.path.realpath(paths[key]))
+    for prefix in (sys.prefix, sys.base_prefix, sys.exec_prefix):
+        roots.add(os.path.realpath(prefix))
+    return tuple(root.rstrip(os.sep) + os.sep for root in roots)
+
+
+def _file_digest(path: str) -> str:
+    import hashlib
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# Class attributes that belong to the class object itself and must not be
+# copied from a reloaded class onto the original
+_CLASS_INTERNALS = frozenset(("__dict__", "__weakref__", "__slots__", "__module__", "__qualname__"))
+
+
+class ModuleReloader:
+    """
+    Keeps user modules in step with their source files across cells.
+
+    Every module in sys.modules whose file lives outside the standard library,
+    site-packages and the kernel itself is tracked by (mtime, size, sha256).
+    check() runs before each cell: modules whose content really changed are
+    reloaded, dependencies first (from their import statements), and each
+    function and class the module defined is patched in place with the new
+    code, then put back under its name. So `from mymod import f`, instances of
+    mymod.Thing and the module object itself all see the edit, and isinstance
+    keeps working.
+
+    A class is patched only when its layout is unchanged (same bases,
+    metaclass and __slots__) and every zero-argument super() in its members
+    can be pointed back at the original class (plain methods, property,
+    classmethod, staticmethod). Otherwise the module keeps the new class and
+    the name is reported as stale, since existing instances still use the old
+    one. So is a class whose patching fails part-way (an Enum, for one); the
+    original is put back exactly as it was. A module that fails to reload is
+    restored to its previous contents.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._roots: Optional[tuple] = None  # found on first use; sysconfig is slow to import
+        self._tracked: dict = {}  # name -> (path, mtime_ns, size, sha256)
+        self._ignored: set = set()  # names known not to be user modules
+        self.reloads = 0
+        # What the latest check() did so far, kept if a cell limit cuts it short
+        self.last_report: Optional[dict] = None
+
+    def _user_file(self, module) -> Optional[str]:
+        path = getattr(module, "__file__", None)
+        if not isinstance(path, str) or not path.endswith(".py"):
+            return None
+        path = os.path.realpath(path)
+        if self._roots is None:
+            self._roots = _library_roots()
+        if path.startswith(self._roots) or f"{os.sep}site-packages{os.sep}" in path:
+            return None
+        return path
+
+    def track_new(self):
+        """Start tracking user modules imported since the last call."""
+        if not self.enabled:
+            return
+        for name, module in list(sys.modules.items()):
+            if name in self._tracked or name in self._ignored or name == "__main__":
+                continue
+            path = self._user_file(module)
+            if path is None:
+                self._ignored.add(name)
+                continue
+            try:
+                st = os.stat(path)
+                self._tracked[name] = (path, st.st_mtime_ns, st.st_size, _file_digest(path))
+            except OSError:
+                self._ignored.add(name)
+
+    def _changed(self) -> list:
+        changed = []
+        for name, (path, mtime_ns, size, digest) in list(self._tracked.items()):
+            if name not in sys.modules:
+                del self._tracked[name]
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if (st.st_mtime_ns, st.st_size) == (mtime_ns, size):
+                continue
+            try:
+                new_digest = _file_digest(path)
+            except OSError:
+                continue
+            self._tracked[name] = (path, st.st_mtime_ns, st.st_size, new_digest)
+            if new_digest != digest:
+                changed.append(name)
+        return changed
+
+    def _imports(self, name: str) -> set:
+        """Modules `name` imports, from its source (relative imports resolved)."""
+        import ast
+        path = self._tracked[name][0]
+        try:
+            with open(path, "rb") as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError, ValueError):
+            return set()
+        package = getattr(sys.modules.get(name), "__package__", None) or ""
+        found = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                found.update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                base = node.module or ""
+                if node.level:
+                    parts = package.split(".") if package else []
+                    parts = parts[:len(parts) - node.level + 1] if node.level > 1 else parts
+                    base = ".".join(parts + ([base] if base else []))
+                found.add(base)
+                found.update(f"{base}.{alias.name}" for alias in node.names)
+        return found
+
+    def _dependency_order(self, names: list) -> list:
+        """Sort `names` so each comes after the changed modules it imports."""
+        pending = set(names)
+        deps = {name: self._imports(name) & pending - {name} for name in names}
+        order = []
+        while pending:
+            ready = sorted(n for n in pending if not deps[n] & pending)
+            if not ready:
+                # Import cycle: reload the rest in name order
+                ready = sorted(pending)
+            order.extend(ready)
+            pending -= set(ready)
+        return order
+
+    def check(self) -> Optional[dict]:
+        """
+        Reload changed user modules. Returns a report, or None if nothing
+        changed. Runs inside the cell's budget: if a limit interrupts it, the
+        modules not yet reloaded are retried before the next cell.
+        """
+        self.last_report = None
+        if not self.enabled:
+            return None
+        changed = self._changed()
+        if not changed:
+            return None
+        report = self.last_report = {"modules": [], "failed": {}, "stale": []}
+        order = self._dependency_order(changed)
+        for i, name in enumerate(order):
+            module = sys.modules.get(name)
+            if module is None:
+                continue
+            try:
+                stale = self._reload(module)
+            except Exception as e:
+                report["failed"][name] = f"{type(e).__name__}: {e}"
+                continue
+            except BaseException:
+                for pending in order[i:]:
+                    if pending in self._tracked:
+                        # A stamp and digest no file has, so _changed() sees it again
+                        path, _, size, _ = self._tracked[pending]
+                        self._tracked[pending] = (path, -1, size, "")
+                raise
+            self.reloads += 1
+            report["modules"].append(name)
+            report["stale"].extend(f"{name}.{attr}" for attr in stale)
+        # Modules first imported by the reloads
+        self.track_new()
+        return report
+
+    def _reload(self, module) -> list:
+        """Reload one module and patch what it defined. Returns unpatchable names."""
+        import importlib
+        old_dict = dict(module.__dict__)
+        try:
+            importlib.reload(module)
+        except BaseException:
+            module.__dict__.clear()
+            module.__dict__.update(old_dict)
+            raise
+        stale = []
+        for attr, old in old_dict.items():
+            new = module.__dict__.get(attr, _MISSING)
+            if new is _MISSING or new is old:
+                continue
+            if getattr(old, "__module__", None) != module.__name__:
+                continue
+            if not (isinstance(old, types.FunctionType) and isinstance(new, types.FunctionType)
+                    or isinstance(old, type) and isinstance(new, type)):
+                continue
+            undo: list = []
+            try:
+                if isinstance(old, type):
+                    patched = _patch_class(old, new, undo)
+                else:
+                    patched = _patch_function(old, new, undo=undo)
+            except Exception:
+                # e.g. an Enum refusing to have its members reassigned
+                patched = False
+            if not patched:
+                # Never leave the original half-patched: put back what was changed
+                _rollback(undo)
+            if patched:
+                module.__dict__[attr] = old
+            else:
+                stale.append(attr)
+        return stale
+
+
+def _patch_function(old: types.FunctionType, new: types.FunctionType, depth: int = 0,
+                    undo: Optional[list] = None) -> bool:
+    """
+    Give `old` the code and defaults of `new`. False if their closures don't
+    line up. What gets changed is logged to `undo` for _rollback().
+    """
+    if old.__code__.co_freevars != new.__code__.co_freevars:
+        return False
+    if old.__code__ == new.__code__ and old.__closure__ and depth < 3:
+        # Same wrapper code (a decorator): patch the functions it closes over
+        for old_cell, new_cell in zip(old.__closure__, new.__closure__):
+            try:
+                inner_old, inner_new = old_cell.cell_contents, new_cell.cell_contents
+            except ValueError:
+                continue
+            if (isinstance(inner_old, types.FunctionType) and isinstance(inner_new, types.FunctionType)
+                    and inner_old is not inner_new):
+                if not _patch_function(inner_old, inner_new, depth + 1, undo):
+                    return False
+    if undo is not None:
+        undo.append((old, None, (old.__code__, old.__defaults__, old.__kwdefaults__,
+                                 old.__doc__, old.__annotations__, dict(old.__dict__))))
+    old.__code__ = new.__code__
+    old.__defaults__ = new.__defaults__
+    old.__kwdefaults__ = new.__kwdefaults__
+    old.__doc__ = new.__doc__
+    old.__annotations__ = new.__annotations__
+    old.__dict__.update(new.__dict__)
+    return True
+
+
+def _cell_holds(cell, value) -> bool:
+    try:
+        return cell.cell_contents is value
+    except ValueError:
+        # Empty cell
+        return False
+
+
+def _class_cell_rebound(func: types.FunctionType, old_cls: type, new_cls: type) -> types.FunctionType:
+    """A copy of `func` whose zero-argument super() refers to `old_cls`."""
+    if not func.__closure__ or "__class__" not in func.__code__.co_freevars:
+        return func
+    closure = tuple(
+        types.CellType(old_cls) if _cell_holds(cell, new_cls) else cell
+        for cell in func.__closure__
+    )
+    rebound = types.FunctionType(func.__code__, func.__globals__, func.__name__,
+                                 func.__defaults__, closure)
+    rebound.__kwdefaults__ = func.__kwdefaults__
+    rebound.__qualname__ = func.__qualname__
+    rebound.__doc__ = func.__doc__
+    rebound.__dict__.update(func.__dict__)
+    return rebound
+
+
+_UNBINDABLE = object()
+
+
+def _rebind_member(value, old_cls: type, new_cls: type):
+    """
+    A class attribute from the reloaded class, with every zero-argument
+    super() inside it pointed at `old_cls`. Handles plain functions and the
+    functions inside property, classmethod and staticmethod. Returns
+    _UNBINDABLE for any other wrapper around such a function, which we can't
+    safely rebuild.
+    """
+    if isinstance(value, types.FunctionType):
+        return _class_cell_rebound(value, old_cls, new_cls)
+    if isinstance(value, (classmethod, staticmethod)):
+        func = value.__func__
+        rebound = _rebind_member(func, old_cls, new_cls)
+        if rebound is _UNBINDABLE:
+            return _UNBINDABLE
+        return value if rebound is func else type(value)(rebound)
+    if type(value) is property:
+        accessors = (value.fget, value.fset, value.fdel)
+        rebound = [None if f is None else _rebind_member(f, old_cls, new_cls) for f in accessors]
+        if any(r is _UNBINDABLE for r in rebound):
+            return _UNBINDABLE
+        if all(r is f for f, r in zip(accessors, rebound)):
+            return value
+        return property(*rebound, value.__doc__)
+    # cached_property, functools.partialmethod, ...: only a problem if the
+    # wrapped function captured the new class
+    for attr in ("func", "__func__", "fget", "__wrapped__"):
+        inner = getattr(value, attr, None)
+        if isinstance(inner, types.FunctionType) and inner.__closure__ and any(
+                _cell_holds(cell, new_cls) for cell in inner.__closure__):
+            return _UNBINDABLE
+    return value
+
+
+def _layout(cls: type) -> tuple:
+    return (
+        type(cls).__qualname__,
+        tuple((c.__module__, c.__qualname__) for c in cls.__mro__[1:]),
+        cls.__dict__.get("__slots__"),
+    )
+
+
+def _rollback(undo: list):
+    """Undo the changes _patch_class and _patch_function logged, newest first."""
+    for target, key, previous in reversed(undo):
+        try:
+            if key is None:
+                (target.__code__, target.__defaults__, target.__kwdefaults__,
+                 target.__doc__, target.__annotations__, saved) = previous
+                target.__dict__.clear()
+                target.__dict__.update(saved)
+            elif previous is _MISSING:
+                if key in target.__dict__:
+                    delattr(target, key)
+            else:
+                setattr(target, key, previous)
+        except (AttributeError, TypeError, ValueError):
+            pass
+    undo.clear()
+
+
+def _set_class_attr(cls: type, key: str, value, undo: Optional[list]):
+    if undo is not None:
+        undo.append((cls, key, cls.__dict__.get(key, _MISSING)))
+    if value is _MISSING:
+        delattr(cls, key)
+    else:
+        setattr(cls, key, value)
+
+
+def _patch_class(old: type, new: type, undo: Optional[list] = None) -> bool:
+    """
+    Move the body of `new` onto `old`. False, with `old` untouched, if their
+    layouts differ or a member can't be rebound to `old`. Changes are logged
+    to `undo`, so a caller can _rollback() if applying them raises (an Enum,
+    say, won't have its members reassigned).
+    """
+    if _layout(old) != _layout(new):
+        return False
+    updates = []
+    for key, value in new.__dict__.items():
+        if key in _CLASS_INTERNALS or isinstance(
+                value, (types.MemberDescriptorType, types.GetSetDescriptorType)):
+            continue
+        current = old.__dict__.get(key, _MISSING)
+        if current is value:
+            # Shared with the old body, e.g. `dtype = int` or Enum's _member_type_
+            continue
+        if isinstance(current, types.FunctionType) and isinstance(value, types.FunctionType) \
+                and current.__code__.co_freevars == value.__code__.co_freevars:
+            # Patched in place below; keeps its own __class__ cell
+            updates.append((key, current, value))
+            continue
+        if (isinstance(current, type) and isinstance(value, type)
+                and value.__qualname__.startswith(new.__qualname__ + ".")
+                and _layout(current) == _layout(value)):
+            # A nested class of this one; anything else class-valued is just a reference
+            updates.append((key, current, value))
+            continue
+        rebound = _rebind_member(value, old, new)
+        if rebound is _UNBINDABLE:
+            return False
+        updates.append((key, _MISSING, rebound))
+    for key, current, value in updates:
+        if current is _MISSING:
+            _set_class_attr(old, key, value, undo)
+        elif isinstance(current, type):
+            if not _patch_class(current, value, undo):
+                _set_class_attr(old, key, value, undo)
+        elif not _patch_function(current, value, undo=undo):
+            _set_class_attr(old, key, _class_cell_rebound(value, old, new), undo)
+    for key in list(old.__dict__):
+        if key not in new.__dict__ and key not in _CLASS_INTERNALS:
+            try:
+                _set_class_attr(old, key, _MISSING, undo)
+            except (AttributeError, TypeError):
+                pass
+    return True
+
+
+LAZY_BATCH = 20
+LAZY_ITEM_CHARS = 500
+# Lazy results kept alive at once; the oldest is dropped past this
+MAX_LAZY_RESULTS = 32
+
+
+def _is_lazy(value) -> bool:
+    """Whether a cell result should be shown a batch at a time instead of repr()'d."""
+    if isinstance(value, range):
+        try:
+            return len(value) > LAZY_BATCH
+        except OverflowError:
+            return True
+    # Files are iterators too, but their repr is what people want to see
+    return isinstance(value, collections.abc.Iterator) and not isinstance(value, io.IOBase)
+
+
+def _short_repr(value) -> str:
+    try:
+        text = repr(value)
+    except Exception as e:
+        return f"<{type(value).__name__}: repr failed: {e}>"
+    if len(text) > LAZY_ITEM_CHARS:
+        text = text[:LAZY_ITEM_CHARS] + "..."
+    return text
+
+
+class LazyResult:
+    """
+    An iterator returned by a cell, kept alive so its items can be pulled on
+    demand. Nothing is consumed beyond what has been asked for, so a lazy
+    pipeline over a huge dataset only ever reads the items actually viewed.
+    """
+
+    def __init__(self, handle: str, cell_id: str, value):
+        self.handle = handle
+        self.cell_id = cell_id
+        self.label = _short_repr(value)
+        self.total: Optional[int] = None
+        if isinstance(value, range):
+            try:
+                self.total = len(value)
+            except OverflowError:
+                pass
+        self._iterator = iter(value)
+        self.position = 0
+        self.done = False
+        self.last_page: Optional[dict] = None
+
+    def pull(self, count: int) -> dict:
+        """
+        The next `count` items as reprs. An exception ends the iterator. If
+        the pull is interrupted (a cell budget), what it got so far is still
+        recorded and left in `last_page`.
+        """
+        start = self.position
+        items = []
+        error = None
+        completed = False
+        try:
+            if not self.done:
+                try:
+                    for item in itertools.islice(self._iterator, max(count, 0)):
+                        items.append(_short_repr(item))
+                except Exception as e:
+                    self.done = True
+                    error = {"type": type(e).__name__, "message": str(e), "traceback": traceback.format_exc()}
+            completed = True
+        finally:
+            self.position += len(items)
+            if completed and (len(items) < count or (self.total is not None and self.position >= self.total)):
+                self.done = True
+            self.last_page = {
+                "handle": self.handle,
+                "label": self.label,
+                "start": start,
+                "items": items,
+                "done": self.done,
+                "total": self.total,
+                "error": error,
+            }
+        return self.last_page
+
+    def summary(self, page: dict) -> str:
+        """Text for the reply's "result" field, for clients that only show that."""
+        shown = ", ".join(page["items"]) + ("" if page["done"] else ", ...")
+        return f"{self.label}: [{shown.lstrip(', ')}]"
+
+
 class ZefKernel:
     """Simple Python kernel with persistent namespace."""
     
     def __init__(self):
         self.namespace = {"__name__": "__main__", "__doc__": None}
-        self.interpreter = InteractiveInterpreter(self.namespace)
+        self.metrics = KernelMetrics(os.environ.get("ZEF_KERNEL_METRICS_FILE"))
+        self.preloader: Optional[Preloader] = None
+        self.completions = CompletionIndex(self.namespace)
+        self.reloader = ModuleReloader(os.environ.get("ZEF_KERNEL_AUTORELOAD", "1") != "0")
+        # Iterator results still being paged through, oldest first
+        self.lazy_results: dict = {}
+        self._lazy_counter = 0
+        self.outputs = OutputStore(spill_threshold(os.environ.get("ZEF_KERNEL_SPILL_BYTES")))
+        # Names the last cell mentioned; their index entries may be stale
+        self._cell_names: set = set()
+        # Whether the last cell ended in a name, attribute or subscript
+        self._last_expr_is_reference = False
+        # Phase timings of the most recent execute(), filled in as it runs
+        self.last_phases: dict = {}
     
-    def execute(self, code: str, cell_id: str = "") -> dict:
+    def execute(self, code: str, cell_id: str = "", limits: Optional[dict] = None) -> dict:
         """Execute code and return structured output."""
         result = {
             "cell_id": cell_id,
@@ -70,22 +1631,70 @@ class ZefKernel:
             "stderr": "",
             "side_effects": [],
             "figures": [],
-            "error": None
+            "error": None,
+            "budget": None,
+            "spilled": None,
+            "autoreload": None,
+            "iterator": None
         }
         
+        if self.preloader is not None:
+            self.preloader.wait_for(code)
+        
+        phases = self.last_phases = {}
+        budget = CellBudget(limits)
+        lazy: Optional[LazyResult] = None
+        
         # Capture stdout and stderr with side effect tracking
-        stdout_capture = SideEffectCapture("stdout")
-        stderr_capture = SideEffectCapture("stderr")
+        self.outputs.release_cell(cell_id)
+        self._release_lazy(cell_id)
+        stdout_capture = SideEffectCapture("stdout", budget, self.outputs, cell_id)
+        stderr_capture = SideEffectCapture("stderr", budget, self.outputs, cell_id)
         
         try:
-            with redirect_stdout(stdout_capture), redirect_stderr(stderr_capture):
+            with redirect_stdout(stdout_capture), redirect_stderr(stderr_capture), budget:
+                # Reloaded module bodies print and run like the cell itself
+                t0 = time.perf_counter()
+                try:
+                    self.reloader.check()
+                finally:
+                    phases["reload"] = time.perf_counter() - t0
+                    result["autoreload"] = self.reloader.last_report
+                    if result["autoreload"]:
+                        # Attribute listings of anything from a reloaded module may be stale
+                        self.completions.invalidate(list(self._names_from_modules(result["autoreload"]["modules"])))
+                
                 # Try to compile as an expression first (to get return value)
                 # If that fails, compile as exec (statements)
-                last_result = self._execute_code(code)
+                t0 = time.perf_counter()
+                try:
+                    last_result = self._execute_code(code)
+                finally:
+                    phases["execute"] = time.perf_counter() - t0
                 
                 if last_result is not None:
-                    result["result"] = repr(last_result)
+                    t0 = time.perf_counter()
+                    if _is_lazy(last_result) and not self._last_expr_is_reference:
+                        lazy = self._keep_lazy(cell_id, last_result)
+                        page = result["iterator"] = lazy.pull(LAZY_BATCH)
+                        result["result"] = lazy.summary(page)
+                        if page["done"]:
+                            del self.lazy_results[lazy.handle]
+                        if page["error"]:
+                            result["status"] = "error"
+                            result["error"] = page["error"]
+                    else:
+                        result["result"] = repr(last_result)
+                    phases["repr"] = time.perf_counter() - t0
                     
+        except BudgetExceeded:
+            result["status"] = "error"
+            result["budget"], result["error"] = self._budget_error(budget)
+            if lazy is not None and lazy.last_page is not None:
+                result["iterator"] = lazy.last_page
+                result["result"] = lazy.summary(lazy.last_page)
+            # Drop whatever the interrupted cell left unreachable
+            gc.collect()
         except SyntaxError as e:
             result["status"] = "error"
             result["error"] = {
@@ -100,6 +1709,12 @@ class ZefKernel:
                 "message": str(e),
                 "traceback": traceback.format_exc()
             }
+        finally:
+            # A late re-fire can interrupt __exit__ itself, so make sure
+            # timers and the watchdog are gone before the next cell
+            budget.close()
+            self.completions.invalidate(self._cell_names)
+            self.reloader.track_new()
         
         result["stdout"] = stdout_capture.getvalue()
         result["stderr"] = stderr_capture.getvalue()
@@ -107,22 +1722,194 @@ class ZefKernel:
         # Collect all side effects (stdout and stderr events)
         result["side_effects"] = stdout_capture.get_effects() + stderr_capture.get_effects()
         
+        spilled = {}
+        for capture in (stdout_capture, stderr_capture):
+            if capture.spill is not None:
+                capture.spill.finish()
+                spilled[capture.effect_type] = capture.spill.info()
+        result["spilled"] = spilled or None
+        
         # Capture any matplotlib figures created during execution
+        t0 = time.perf_counter()
         result["figures"] = self._capture_figures()
+        phases["figures"] = time.perf_counter() - t0
         
         return result
     
+    @staticmethod
+    def _budget_error(budget: CellBudget) -> tuple:
+        """(budget, error) reply fields for an interrupted cell."""
+        tripped = budget.tripped or {"name": "unknown", "limit": None, "used": None}
+        return tripped, {
+            "type": "BudgetExceeded",
+            "message": f"Cell exceeded its {tripped['name']} budget "
+                       f"(limit {tripped['limit']}, used {tripped['used']}); "
+                       f"output is partial",
+            "traceback": traceback.format_exc()
+        }
+
+    def _keep_lazy(self, cell_id: str, value) -> LazyResult:
+        self._lazy_counter += 1
+        lazy = LazyResult(f"iter-{self._lazy_counter}", cell_id, value)
+        self.lazy_results[lazy.handle] = lazy
+        while len(self.lazy_results) > MAX_LAZY_RESULTS:
+            del self.lazy_results[next(iter(self.lazy_results))]
+        return lazy
+
+    def _release_lazy(self, cell_id: str):
+        for handle in [h for h, lazy in self.lazy_results.items() if lazy.cell_id == cell_id]:
+            del self.lazy_results[handle]
+
+    def more(self, handle: str, count: int = LAZY_BATCH, limits: Optional[dict] = None) -> dict:
+        """Pull the next `count` items of a lazy result, capturing output like a cell."""
+        result = {
+            "command": "more",
+            "status": "ok",
+            "stdout": "",
+            "stderr": "",
+            "side_effects": [],
+            "error": None,
+            "budget": None,
+            "iterator": None
+        }
+        lazy = self.lazy_results.get(handle)
+        if lazy is None:
+            result["status"] = "error"
+            result["error"] = {
+                "type": "ValueError",
+                "message": f"Unknown or exhausted iterator handle: {handle}",
+                "traceback": ""
+            }
+            return result
+
+        budget = CellBudget(limits)
+        stdout_capture = SideEffectCapture("stdout", budget)
+        stderr_capture = SideEffectCapture("stderr", budget)
+        try:
+            with redirect_stdout(stdout_capture), redirect_stderr(stderr_capture), budget:
+                page = result["iterator"] = lazy.pull(count)
+            if page["error"]:
+                result["status"] = "error"
+                result["error"] = page["error"]
+        except BudgetExceeded:
+            result["status"] = "error"
+            result["budget"], result["error"] = self._budget_error(budget)
+            result["iterator"] = lazy.last_page
+        finally:
+            budget.close()
+
+        if lazy.done:
+            self.lazy_results.pop(handle, None)
+        result["stdout"] = stdout_capture.getvalue()
+        result["stderr"] = stderr_capture.getvalue()
+        result["side_effects"] = stdout_capture.get_effects() + stderr_capture.get_effects()
+        return result
+
+    def _user_names(self) -> list:
+        """Namespace entries that hold session data (not dunders or modules)."""
+        return [
+            name for name, value in self.namespace.items()
+            if not (name.startswith("__") and name.endswith("__"))
+            and not isinstance(value, types.ModuleType)
+        ]
+
+    def _names_from_modules(self, modules: list):
+        """Namespace names bound to one of `modules` or to something defined there."""
+        reloaded = set(modules)
+        for name, value in list(self.namespace.items()):
+            owner = value.__name__ if isinstance(value, types.ModuleType) else getattr(value, "__module__", None)
+            if owner in reloaded or type(value).__module__ in reloaded:
+                yield name
+
+    def memory_report(self, limit: int = 50) -> dict:
+        """
+        Estimate deep sizes of namespace entries, largest first, and group
+        them by type. Objects shared between entries are counted once, under
+        the first (largest-looking) entry that reaches them.
+
+        The whole report visits at most MEMORY_REPORT_MAX_OBJECTS objects.
+        Entries reached after that get their shallow size only; they and the
+        report itself then carry "complete": false, and total_bytes is a
+        lower bound.
+        """
+        names = self._user_names()
+        # Visit big containers first so shared data is charged to them
+        names.sort(key=lambda n: sys.getsizeof(self.namespace[n], 0), reverse=True)
+        seen: set = set()
+        entries = []
+        by_type: dict = {}
+        for name in names:
+            value = self.namespace[name]
+            remaining = MEMORY_REPORT_MAX_OBJECTS - len(seen)
+            if remaining > 0:
+                size, complete = deep_sizeof(value, seen, remaining)
+            else:
+                size, complete = sys.getsizeof(value, 0), False
+            type_name = f"{type(value).__module__}.{type(value).__qualname__}"
+            type_name = type_name.replace("builtins.", "")
+            entries.append({"name": name, "type": type_name, "bytes": size, "complete": complete})
+            group = by_type.setdefault(type_name, {"count": 0, "bytes": 0})
+            group["count"] += 1
+            group["bytes"] += size
+        entries.sort(key=lambda e: e["bytes"], reverse=True)
+        return {
+            "rss_bytes": current_rss(),
+            "total_bytes": sum(e["bytes"] for e in entries),
+            "complete": all(e["complete"] for e in entries),
+            "entries": entries[:limit],
+            "by_type": dict(sorted(by_type.items(), key=lambda kv: kv[1]["bytes"], reverse=True)),
+        }
+
+    def reclaim(self, names: Optional[list] = None, drop_results: bool = True) -> dict:
+        """
+        Drop the given names (and cached results), run a full GC and hand
+        freed heap back to the OS. Reports how much RSS went away.
+        """
+        rss_before = current_rss()
+        dropped = []
+        for name in names or []:
+            if name in self.namespace:
+                del self.namespace[name]
+                dropped.append(name)
+        if drop_results:
+            if "_" in self.namespace:
+                del self.namespace["_"]
+                dropped.append("_")
+            # Paused iterators hold their whole pipeline
+            self.lazy_results.clear()
+            # Tracebacks of the last error keep whole frames alive
+            for attr in ("last_type", "last_value", "last_traceback"):
+                if hasattr(sys, attr):
+                    delattr(sys, attr)
+            if 'matplotlib.pyplot' in sys.modules:
+                sys.modules['matplotlib.pyplot'].close('all')
+
+        collected = gc.collect()
+        trimmed = malloc_trim()
+        rss_after = current_rss()
+        freed = None
+        if rss_before is not None and rss_after is not None:
+            freed = max(rss_before - rss_after, 0)
+        return {
+            "dropped": dropped,
+            "gc_collected": collected,
+            "malloc_trim": trimmed,
+            "rss_before": rss_before,
+            "rss_after": rss_after,
+            "freed_bytes": freed,
+        }
+
     def _capture_figures(self) -> list:
         """Capture any open matplotlib figures as base64 PNG data."""
         if 'matplotlib.pyplot' not in sys.modules:
             return []
         
+        import base64
         import matplotlib.pyplot as plt
         fignums = plt.get_fignums()
         if not fignums:
             return []
         
-        import base64
         figures = []
         for num in fignums:
             fig = plt.figure(num)
@@ -149,7 +1936,7 @@ class ZefKernel:
         3. Execute everything and return the last expression's value
         """
         import ast
-        
+        self._last_expr_is_reference = False
         code = code.strip()
         if not code:
             return None
@@ -165,11 +1952,15 @@ class ZefKernel:
         if not tree.body:
             return None
         
+        # Anything the cell names may be rebound or mutated by it
+        self._cell_names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+        
         # Check if the last statement is an expression
         last_stmt = tree.body[-1]
         last_value = None
         
         if isinstance(last_stmt, ast.Expr):
+            self._last_expr_is_reference = isinstance(last_stmt.value, (ast.Name, ast.Attribute, ast.Subscript))
             # The last statement is an expression - we want its value
             # Execute all but the last statement
             if len(tree.body) > 1:
@@ -189,59 +1980,309 @@ class ZefKernel:
         return last_value
 
 
+TRACE_VERSION = 1
+
+# Startup settings that change replies; recorded so a replay can reproduce them
+TRACE_ENV = ("ZEF_KERNEL_PROFILE", "ZEF_KERNEL_SPILL_BYTES", "ZEF_KERNEL_AUTORELOAD")
+
+
+class SessionRecorder:
+    """
+    Records every inbound line and outbound reply to a gzipped JSON-lines
+    trace. After a header line, each record is one of
+      {"t": 0.0123, "in": 3, "n": 120, "line": "..."}
+      {"t": 0.0456, "out": 3, "n": 2048, "line": "..."}
+    "t" is seconds since the kernel process started, "n" the line's size in
+    bytes and "out" the number of the inbound message being answered (null
+    for the ready message). The stream is flushed per record so a killed
+    kernel still leaves a readable trace.
+
+    The header holds the TRACE_ENV variables that were set and the startup
+    profile's contents, since the profile file may be gone by replay time.
+    """
+
+    def __init__(self, path: str, profile: Optional[dict] = None):
+        self.path = path
+        import gzip
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        # Which inbound message each thread is currently answering
+        self._local = threading.local()
+        self._write({
+            "trace": TRACE_VERSION,
+            "started": time.time(),
+            "python": sys.version.split()[0],
+            "env": {name: os.environ[name] for name in TRACE_ENV if name in os.environ},
+            "profile": profile,
+        })
+
+    def _write(self, record: dict):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def _now(self) -> float:
+        return round(time.perf_counter() - _MODULE_START, 6)
+
+    def inbound(self, seq: int, line: str):
+        self._write({"t": self._now(), "in": seq, "n": len(line.encode()), "line": line})
+
+    def handling(self, seq: Optional[int]):
+        """Attribute this thread's following replies to inbound message `seq`."""
+        self._local.seq = seq
+
+    def outbound(self, line: str):
+        seq = getattr(self._local, "seq", None)
+        self._write({"t": self._now(), "out": seq, "n": len(line.encode()), "line": line})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# The real stdout. Cells run with sys.stdout redirected into a capture
+# buffer, and replies may be written from the reader thread meanwhile.
+_protocol_out = sys.stdout
+_send_lock = threading.Lock()
+_recorder: Optional[SessionRecorder] = None
+
+
+def send_line(line: str):
+    """Write one already-serialized protocol message."""
+    with _send_lock:
+        _protocol_out.write(line + "\n")
+        _protocol_out.flush()
+    if _recorder is not None:
+        _recorder.outbound(line)
+
+
+def send(message: dict) -> str:
+    """Serialize and write one protocol message. Returns the JSON line."""
+    line = json.dumps(message)
+    send_line(line)
+    return line
+
+
+# Commands answered straight from the stdin reader thread, even while a cell
+# is running. They only read the namespace and never execute user code.
+IMMEDIATE_COMMANDS = ("complete", "signature", "read_output")
+
+
+def handle_immediate(kernel: ZefKernel, message: dict):
+    command = message["command"]
+    code = message.get("code", "")
+    cursor_pos = message.get("cursor_pos")
+    try:
+        if command == "complete":
+            payload = kernel.completions.complete(code, cursor_pos)
+        elif command == "signature":
+            payload = kernel.completions.signature(code, cursor_pos)
+        else:
+            spill = kernel.outputs.get(message.get("handle", ""))
+            if message.get("bytes") is not None:
+                payload = spill.read_bytes(*message["bytes"])
+            else:
+                payload = spill.read_lines(*(message.get("lines") or [0, None]))
+            payload.update(handle=spill.handle, total_bytes=spill.bytes, total_lines=spill.lines)
+        send({"status": "ok", "command": command, "id": message.get("id"), **payload})
+    except Exception as e:
+        send({
+            "status": "error",
+            "command": command,
+            "id": message.get("id"),
+            "error": {"type": type(e).__name__, "message": str(e), "traceback": ""}
+        })
+
+
+def read_stdin(kernel: ZefKernel, inbox: queue.Queue):
+    """
+    Reader thread: answer immediate commands, queue the rest in order.
+    Queued items are (seq, line), seq numbering inbound messages from 0.
+    """
+    seq = -1
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        seq += 1
+        if _recorder is not None:
+            _recorder.inbound(seq, line)
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            # Let the main loop report it, in order with other replies
+            inbox.put((seq, line))
+            continue
+        if isinstance(message, dict) and message.get("command") in IMMEDIATE_COMMANDS:
+            if _recorder is not None:
+                _recorder.handling(seq)
+            handle_immediate(kernel, message)
+            continue
+        inbox.put((seq, line))
+    inbox.put(None)
+
+
 def main():
     """Main loop - read JSON commands from stdin, execute, write JSON results to stdout."""
+    global _recorder
+    main_start = time.perf_counter()
+    profile_path = os.environ.get("ZEF_KERNEL_PROFILE")
+    profile = load_startup_profile(profile_path)
+
+    # Must be decided before anything imports matplotlib
+    if profile.get("matplotlib_backend"):
+        os.environ["MPLBACKEND"] = profile["matplotlib_backend"]
+
     kernel = ZefKernel()
+    init_done = time.perf_counter()
+
+    preload = profile.get("preload") or []
+    background = profile.get("background", True)
+    if preload:
+        kernel.preloader = kernel.metrics.preloader = Preloader(kernel.namespace, preload)
+        if not background:
+            kernel.preloader.run()
+
+    trace_path = os.environ.get("ZEF_KERNEL_TRACE")
+    if trace_path:
+        try:
+            _recorder = SessionRecorder(trace_path, profile if profile_path else None)
+        except OSError as e:
+            print(f"Cannot record trace to {trace_path}: {e}", file=sys.stderr)
+
+    inbox: queue.Queue = queue.Queue()
+    threading.Thread(target=read_stdin, args=(kernel, inbox), daemon=True).start()
+
+    ready = time.perf_counter()
+    kernel.metrics.startup = {
+        "profile": profile_path if profile else None,
+        "imports_ms": round((main_start - _MODULE_START) * 1000, 2),
+        "init_ms": round((init_done - main_start) * 1000, 2),
+        "preload_mode": ("background" if background else "foreground") if preload else "none",
+        "to_ready_ms": round((ready - _MODULE_START) * 1000, 2),
+        "matplotlib_backend": os.environ.get("MPLBACKEND"),
+    }
     
     # Signal that kernel is ready
-    print(json.dumps({"status": "ready", "message": "Zef Kernel ready"}), flush=True)
+    send({
+        "status": "ready",
+        "message": "Zef Kernel ready",
+        "startup": dict(
+            kernel.metrics.startup,
+            **({"preload": kernel.preloader.report()} if kernel.preloader else {})
+        )
+    })
+
+    if kernel.preloader is not None and background:
+        kernel.preloader.start_background()
     
-    for line in sys.stdin:
-        line = line.strip()
-        if not line:
-            continue
-        
+    try:
+        serve(kernel, inbox)
+    finally:
+        kernel.outputs.close()
+        if _recorder is not None:
+            _recorder.close()
+
+
+def serve(kernel: ZefKernel, inbox: queue.Queue):
+    """Handle queued messages in order until shutdown or end of input."""
+    for seq, line in iter(inbox.get, None):
+        if _recorder is not None:
+            _recorder.handling(seq)
         try:
             message = json.loads(line)
             
             if message.get("command") == "shutdown":
-                print(json.dumps({"status": "shutdown"}), flush=True)
+                send({"status": "shutdown"})
                 break
 
-            if message.get("command") == "inject_variables":
+            command = message.get("command", "execute")
+            kernel.metrics.count_command(command)
+
+            if command == "stats":
+                send({
+                    "status": "ok",
+                    "command": "stats",
+                    "stats": kernel.metrics.snapshot(kernel.namespace)
+                })
+                continue
+
+            if command == "memory_report":
+                send({
+                    "status": "ok",
+                    "command": "memory_report",
+                    "report": kernel.memory_report(message.get("limit", 50))
+                })
+                continue
+
+            if command == "more":
+                send(kernel.more(
+                    message.get("handle", ""),
+                    message.get("count", LAZY_BATCH),
+                    message.get("limits")
+                ))
+                continue
+
+            if command == "reclaim":
+                reclaimed = kernel.reclaim(message.get("names"), message.get("drop_results", True))
+                kernel.completions.invalidate(reclaimed["dropped"])
+                send({
+                    "status": "ok",
+                    "command": "reclaim",
+                    "reclaimed": reclaimed
+                })
+                kernel.metrics.dump(kernel.namespace)
+                continue
+
+            if command == "inject_variables":
+                kernel.metrics.inject_bytes.observe(len(line))
                 variables = message.get("variables", {})
                 kernel.namespace.update(variables)
-                print(json.dumps({
+                kernel.completions.invalidate(variables)
+                send({
                     "status": "ok",
                     "command": "inject_variables",
                     "count": len(variables)
-                }), flush=True)
+                })
+                kernel.metrics.dump(kernel.namespace)
                 continue
 
             code = message.get("code", "")
             cell_id = message.get("cell_id", "")
+            limits = message.get("limits")
             
-            result = kernel.execute(code, cell_id)
-            print(json.dumps(result), flush=True)
+            result = kernel.execute(code, cell_id, limits)
+            t0 = time.perf_counter()
+            reply = json.dumps(result)
+            kernel.last_phases["serialize"] = time.perf_counter() - t0
+            send_line(reply)
+
+            kernel.metrics.reply_bytes.observe(len(reply))
+            kernel.metrics.record_execution(result, kernel.last_phases)
+            kernel.metrics.dump(kernel.namespace)
             
         except json.JSONDecodeError as e:
-            print(json.dumps({
+            send({
                 "status": "error",
                 "error": {
                     "type": "JSONDecodeError",
                     "message": f"Invalid JSON input: {e}",
                     "traceback": ""
                 }
-            }), flush=True)
+            })
         except Exception as e:
-            print(json.dumps({
+            send({
                 "status": "error",
                 "error": {
                     "type": type(e).__name__,
                     "message": str(e),
                     "traceback": traceback.format_exc()
                 }
-            }), flush=True)
+            })
 
 
 if __name__ == "__main__":
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Zef Markdown Block Index
+
+Extracts the \"\"\"md documentation blocks that the Python file preview renders,
+from every .py file under a directory, together with the symbol each block
+belongs to and its line range.
+
+Results are kept in an on-disk JSON index keyed by path, with each file's
+mtime, size and sha256. Only files whose size or mtime moved are re-read, so
+refreshing an unchanged tree costs one stat() per file; the hash tells a real
+edit apart from a touch. Cold scans are spread across a process pool.
+
+Usage:
+    python zef_md_index.py ROOT                 # Refresh the index for ROOT
+    python zef_md_index.py ROOT --files a.py    # Re-scan just these files (on save)
+    python zef_md_index.py ROOT --json          # Print the blocks as JSON
+
+Index format (ROOT/.zef-md-index.json by default):
+    {"version": 1, "files": {"pkg/mod.py": {
+        "mtime_ns": ..., "size": ..., "sha256": "...", "error": null,
+        "blocks": [{"start_line": 1, "end_line": 12, "symbol": "<module>",
+                    "kind": "module", "text": "# Title ..."}]}}}
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+INDEX_VERSION = 1
+DEFAULT_INDEX_NAME = ".zef-md-index.json"
+
+# Directories that never hold documentation we want to render
+SKIP_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+    ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".ruff_cache",
+    "site-packages", "build", "dist",
+}
+
+# Files in #%% cell mode are rendered differently by the preview
+CELL_MARKER = re.compile(r"^#\s*%%", re.MULTILINE)
+
+# def/class header, for the indentation fallback
+DEF_LINE = re.compile(r"(?:async\s+)?(def|class)\s+([A-Za-z_]\w*)")
+
+# Cheap pre-check on raw bytes before tokenizing at all
+MD_MARKERS = (b'"""md', b"'''md")
+
+# Below this many files, scanning in-process beats starting a pool
+POOL_THRESHOLD = 64
+
+
+def _symbol_spans(source: str) -> list:
+    """
+    (start_line, end_line, qualified_name, kind) for every class and function,
+    outermost first. Uses ast when the file parses, indentation otherwise.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return _symbol_spans_by_indent(source)
+    spans = []
+
+    def visit(node, prefix: str):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                name = f"{prefix}{child.name}"
+                kind = "class" if isinstance(child, ast.ClassDef) else "function"
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                spans.append((start, child.end_lineno, name, kind))
+                visit(child, name + ".")
+            else:
+                visit(child, prefix)
+
+    visit(tree, "")
+    return spans
+
+
+def _symbol_spans_by_indent(source: str) -> list:
+    """
+    Fallback for files ast rejects. The preview happily renders md blocks that
+    aren't valid Python (e.g. a \"\"\"md mention inside a block), so we still want
+    symbols for those: a def/class runs until the next line indented at or
+    below it.
+    """
+    spans = []
+    open_defs = []  # (indent, start_line, name, kind), innermost last
+    lines = source.split("\n")
+    for lineno, line in enumerate(lines, 1):
+        stripped = line.lstrip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        indent = len(line) - len(stripped)
+        while open_defs and indent <= open_defs[-1][0]:
+            ind, start, name, kind = open_defs.pop()
+            spans.append((start, lineno - 1, name, kind))
+        match = DEF_LINE.match(stripped)
+        if match:
+            prefix = open_defs[-1][2] + "." if open_defs else ""
+            kind = "class" if match.group(1) == "class" else "function"
+            open_defs.append((indent, lineno, prefix + match.group(2), kind))
+    for ind, start, name, kind in open_defs:
+        spans.append((start, len(lines), name, kind))
+    return sorted(spans, key=lambda span: (span[0], -span[1]))
+
+
+def _dedent(text: str) -> str:
+    """Strip common leading whitespace, like the preview's dedentText()."""
+    lines = text.split("\n")
+    indents = [len(line) - len(line.lstrip()) for line in lines if line.strip()]
+    margin = min(indents) if indents else 0
+    return "\n".join(line[margin:] for line in lines).strip("\n")
+
+
+def _scan_lines(source: str) -> list:
+    """
+    Find md blocks with exactly the preview's rules (convertPythonToMarkdown):
+    a line whose stripped text starts with \"\"\"md or \'\'\'md opens a block, the
+    next \"\"\" or \'\'\' anywhere on a later line closes it.
+    """
+    blocks = []
+    start = None
+    content = []
+    for lineno, line in enumerate(source.split("\n"), 1):
+        if start is None:
+            stripped = line.lstrip()
+            if stripped.startswith(('"""md', "'''md")):
+                start = lineno
+                after = stripped[5:]
+                content = [after] if after.strip() else []
+            continue
+        close = line.find('"""')
+        if close == -1:
+            close = line.find("'''")
+        if close == -1:
+            content.append(line)
+            continue
+        if line[:close].strip():
+            content.append(line[:close])
+        blocks.append((start, lineno, content))
+        start = None
+    if start is not None:
+        # Unterminated: the preview renders it through to the end of the file
+        blocks.append((start, lineno, content))
+    return blocks
+
+
+def extract_blocks(source: str) -> list:
+    """Return the md blocks in `source`, each with its enclosing symbol."""
+    if CELL_MARKER.search(source):
+        # #%% files are rendered cell by cell; their md lives in cells, not strings
+        return []
+    blocks = [
+        {
+            "start_line": start,
+            "end_line": end,
+            "symbol": "<module>",
+            "kind": "module",
+            "text": _dedent("\n".join(content)),
+        }
+        for start, end, content in _scan_lines(source)
+    ]
+    if blocks:
+        spans = _symbol_spans(source)
+        for block in blocks:
+            # Innermost enclosing definition wins; spans are outermost first
+            for start, end, name, kind in spans:
+                if start < block["start_line"] and block["end_line"] <= end:
+                    block["symbol"], block["kind"] = name, kind
+    return blocks
+
+
+def scan_file(path: str) -> dict:
+    """
+    Read, hash and extract one file. Runs in worker processes. A file that
+    can't be read (a dangling symlink such as an editor's .#lock file, or one
+    deleted mid-walk) gets an entry with only "error" set, and is retried on
+    the next refresh.
+    """
+    try:
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return {"mtime_ns": None, "size": None, "sha256": None,
+                "error": f"{type(e).__name__}: {e}", "blocks": []}
+    entry = {
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "error": None,
+        "blocks": [],
+    }
+    if not any(marker in data for marker in MD_MARKERS):
+        return entry
+    try:
+        source = data.decode("utf-8")
+        entry["blocks"] = extract_blocks(source)
+    except UnicodeDecodeError as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    return entry
+
+
+def iter_python_files(root: str):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+        for name in filenames:
+            if name.endswith(".py"):
+                yield os.path.join(dirpath, name)
+
+
+class MdIndex:
+    """On-disk index of md blocks under `root`."""
+
+    def __init__(self, root: str, index_path: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path or os.path.join(self.root, DEFAULT_INDEX_NAME)
+        self.files: dict = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if data.get("version") == INDEX_VERSION:
+            self.files = data.get("files", {})
+
+    def save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+
+    def _needs_scan(self, path: str, rel: str) -> bool:
+        entry = self.files.get(rel)
+        if entry is None:
+            return True
+        try:
+            st = os.stat(path)
+        except OSError:
+            return True
+        return entry["mtime_ns"] != st.st_mtime_ns or entry["size"] != st.st_size
+
+    def _scan(self, paths: list, jobs: Optional[int]) -> int:
+        """Scan `paths` and merge the results. Returns how many changed content."""
+        if len(paths) >= POOL_THRESHOLD and jobs != 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(scan_file, paths, chunksize=32))
+        else:
+            results = [scan_file(p) for p in paths]
+
+        changed = 0
+        for path, entry in zip(paths, results):
+            rel = self._rel(path)
+            old = self.files.get(rel)
+            # Touched but identical content: keep the stamp fresh, nothing else
+            if old is None or old["sha256"] != entry["sha256"]:
+                changed += 1
+            self.files[rel] = entry
+        return changed
+
+    def refresh(self, jobs: Optional[int] = None) -> dict:
+        """Bring the whole index up to date. Returns counts of what happened."""
+        seen = set()
+        stale = []
+        for path in iter_python_files(self.root):
+            rel = self._rel(path)
+            seen.add(rel)
+            if self._needs_scan(path, rel):
+                stale.append(path)
+        removed = [rel for rel in self.files if rel not in seen]
+        for rel in removed:
+            del self.files[rel]
+        changed = self._scan(stale, jobs) if stale else 0
+        return {"files": len(seen), "scanned": len(stale), "changed": changed, "removed": len(removed)}
+
+    def update_files(self, paths: list) -> dict:
+        """Re-scan specific files, e.g. the one just saved."""
+        present = [p for p in paths if os.path.isfile(p)]
+        for p in paths:
+            if not os.path.isfile(p):
+                self.files.pop(self._rel(p), None)
+        stale = [p for p in present if self._needs_scan(p, self._rel(p))]
+        changed = self._scan(stale, jobs=1) if stale else 0
+        return {"files": len(paths), "scanned": len(stale), "changed": changed,
+                "removed": len(paths) - len(present)}
+
+    def blocks(self) -> list:
+        """All blocks, each tagged with its file."""
+        return [
+            dict(block, file=rel)
+            for rel, entry in sorted(self.files.items())
+            for block in entry["blocks"]
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index \"\"\"md documentation blocks in Python sources.")
+    parser.add_argument("root", nargs="?", default=".", help="Directory to index (default: .)")
+    parser.add_argument("--index", help=f"Index file (default: ROOT/{DEFAULT_INDEX_NAME})")
+    parser.add_argument("--files", nargs="+", help="Only re-scan these files")
+    parser.add_argument("--jobs", type=int, help="Worker processes for cold scans (default: CPU count)")
+    parser.add_argument("--json", action="store_true", help="Print all blocks as JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = MdIndex(args.root, args.index)
+    if args.files:
+        counts = index.update_files(args.files)
+    else:
+        counts = index.refresh(args.jobs)
+    index.save()
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        json.dump(index.blocks(), sys.stdout, indent=2)
+        print()
+    else:
+        total = sum(len(e["blocks"]) for e in index.files.values())
+        errors = sum(1 for e in index.files.values() if e["error"])
+        print(f"{counts['files']} files, {counts['scanned']} scanned, {counts['changed']} changed, "
+              f"{counts['removed']} removed; {total} md blocks"
+              f"{f', {errors} unreadable' if errors else ''} ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Zef Kernel Trace Replay
+
+Feeds a trace recorded with ZEF_KERNEL_TRACE (see SessionRecorder in
+zef_kernel.py) into a fresh kernel, then compares every reply and its latency
+against the recording.
+
+Messages are replayed one at a time, each waiting for its replies, so results
+don't depend on timing. Completion and signature queries, which the kernel
+answers while a cell runs, are replayed after exactly the cells that had
+finished when they were answered, so they see the same namespace. Recorded
+latencies are measured the same way: a queued message's clock starts when the
+kernel could first pick it up (its arrival, or the previous queued reply,
+whichever is later), not when it was read.
+
+The kernel starts with the settings recorded in the trace header
+(ZEF_KERNEL_SPILL_BYTES, ZEF_KERNEL_AUTORELOAD and the startup profile's
+contents), not the replaying shell's.
+
+Usage:
+    python zef_replay.py TRACE                  # Replay and compare
+    python zef_replay.py TRACE --python PATH    # Replay under another interpreter
+    python zef_replay.py TRACE --slower 2.0     # Flag messages 2x slower than recorded
+    python zef_replay.py TRACE --json           # Machine-readable report
+
+Exit status is 1 if any reply differs or any message regressed, so traces from
+real notebooks can serve as performance regression fixtures.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from typing import Optional
+
+from zef_kernel import IMMEDIATE_COMMANDS, TRACE_ENV, TRACE_VERSION
+
+KERNEL_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zef_kernel.py")
+
+# Reply fields that legitimately differ between runs
+VOLATILE_KEYS = {"startup", "stats", "report", "reclaimed", "used", "traceback"}
+
+# Object addresses in reprs, e.g. <Foo object at 0x7f3a...>
+ADDRESS = re.compile(r"0x[0-9a-fA-F]{6,}")
+
+
+def load_trace(path: str) -> tuple:
+    """
+    Return (header, inbound, replies): inbound is a list of records in order,
+    replies maps an inbound seq to its reply records. A trace cut short by a
+    killed kernel is read up to the last complete record.
+    """
+    header = None
+    inbound = []
+    replies: dict = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for raw in f:
+                try:
+                    record = json.loads(raw)
+                except json.JSONDecodeError:
+                    break
+                if "trace" in record:
+                    header = record
+                elif "in" in record:
+                    inbound.append(record)
+                elif record.get("out") is not None:
+                    replies.setdefault(record["out"], []).append(record)
+        except (EOFError, zlib.error):
+            pass
+    if header is None or header.get("trace") != TRACE_VERSION:
+        raise ValueError(f"{path} is not a version {TRACE_VERSION} kernel trace")
+    return header, inbound, replies
+
+
+def describe(line: str) -> tuple:
+    """(label, immediate) for an inbound line."""
+    try:
+        message = json.loads(line)
+    except json.JSONDecodeError:
+        return "invalid json", False
+    if not isinstance(message, dict):
+        return "invalid message", False
+    command = message.get("command", "execute")
+    if command == "execute":
+        return f"execute {message.get('cell_id', '')}".rstrip(), False
+    return command, command in IMMEDIATE_COMMANDS
+
+
+def recorded_latencies(inbound: list, replies: dict) -> dict:
+    """seq -> recorded service time in seconds, for messages that got replies."""
+    latencies = {}
+    queue_free_at = 0.0
+    for record in inbound:
+        seq = record["in"]
+        answers = replies.get(seq)
+        if not answers:
+            continue
+        _, immediate = describe(record["line"])
+        started = record["t"] if immediate else max(record["t"], queue_free_at)
+        finished = answers[-1]["t"]
+        latencies[seq] = finished - started
+        if not immediate:
+            queue_free_at = finished
+    return latencies
+
+
+def replay_order(inbound: list, replies: dict) -> list:
+    """
+    Inbound records in the order to replay them. Queued messages keep their
+    order; each immediate query goes after the last queued message that had
+    replied by the time the query was answered (or arrived, if it never was).
+    """
+    queued = []
+    immediates = []
+    for record in inbound:
+        _, immediate = describe(record["line"])
+        (immediates if immediate else queued).append(record)
+
+    def done_at(record) -> float:
+        answers = replies.get(record["in"])
+        return answers[-1]["t"] if answers else float("inf")
+
+    slots: dict = {}
+    for record in immediates:
+        answers = replies.get(record["in"])
+        seen_at = answers[-1]["t"] if answers else record["t"]
+        position = sum(1 for q in queued if done_at(q) <= seen_at)
+        slots.setdefault(position, []).append(record)
+
+    order = list(slots.get(0, []))
+    for i, record in enumerate(queued, 1):
+        order.append(record)
+        order += slots.get(i, [])
+    return order
+
+
+def normalize(line: str):
+    """Parse a reply and blank out what may differ between runs."""
+    try:
+        value = json.loads(line)
+    except json.JSONDecodeError:
+        return line
+
+    def clean(v):
+        if isinstance(v, dict):
+            return {k: clean(x) for k, x in v.items() if k not in VOLATILE_KEYS}
+        if isinstance(v, list):
+            return [clean(x) for x in v]
+        if isinstance(v, str):
+            return ADDRESS.sub("0x?", v)
+        return v
+
+    return clean(value)
+
+
+def differing_keys(expected, actual) -> list:
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        return sorted(k for k in expected.keys() | actual.keys() if expected.get(k) != actual.get(k))
+    return [] if expected == actual else ["<reply>"]
+
+
+class KernelProcess:
+    """
+    A fresh kernel subprocess with timestamped reply lines. It starts with
+    the recorded startup settings (`recorded_env`, `profile`) rather than
+    whatever this shell has set; the profile is written to a temporary file.
+    """
+
+    def __init__(self, python: str, kernel: str, recorded_env: Optional[dict] = None,
+                 profile: Optional[dict] = None):
+        env = dict(os.environ, MPLBACKEND="Agg")
+        for name in TRACE_ENV + ("ZEF_KERNEL_TRACE",):
+            env.pop(name, None)
+        env.update(recorded_env or {})
+        self.profile_path = None
+        if "ZEF_KERNEL_PROFILE" in env:
+            fd, self.profile_path = tempfile.mkstemp(prefix="zef-replay-profile-", suffix=".json")
+            with os.fdopen(fd, "w") as f:
+                json.dump(profile or {}, f)
+            env["ZEF_KERNEL_PROFILE"] = self.profile_path
+        self.process = subprocess.Popen(
+            [python, "-u", kernel],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, env=env,
+        )
+        self.lines: queue.Queue = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.lines.put((time.perf_counter(), line.rstrip("\n")))
+        self.lines.put(None)
+
+    def receive(self, timeout: float) -> Optional[tuple]:
+        try:
+            return self.lines.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def send(self, line: str) -> float:
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+        return time.perf_counter()
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.send(json.dumps({"command": "shutdown"}))
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+        if self.profile_path is not None:
+            try:
+                os.remove(self.profile_path)
+            except OSError:
+                pass
+
+
+def replay(path: str, python: str, kernel: str, slower: float, min_ms: float, timeout: float) -> dict:
+    header, inbound, replies = load_trace(path)
+    expected_latency = recorded_latencies(inbound, replies)
+
+    proc = KernelProcess(python, kernel, header.get("env"), header.get("profile"))
+    results = []
+    try:
+        ready = proc.receive(timeout)
+        if ready is None:
+            raise RuntimeError("kernel did not become ready")
+
+        for record in replay_order(inbound, replies):
+            seq = record["in"]
+            label, _ = describe(record["line"])
+            expected = replies.get(seq, [])
+            sent = proc.send(record["line"])
+            received = []
+            stalled = False
+            # A message cut off by the end of the recording still gets one reply
+            for _ in range(max(len(expected), 1)):
+                item = proc.receive(timeout)
+                if item is None:
+                    stalled = True
+                    break
+                received.append(item)
+
+            entry = {
+                "seq": seq,
+                "message": label,
+                "bytes_in": record["n"],
+                "recorded_ms": None,
+                "replay_ms": None,
+                "bytes_out": sum(len(line.encode()) for _, line in received),
+                "match": None,
+                "differs": [],
+                "slower": False,
+            }
+            if received:
+                entry["replay_ms"] = round((received[-1][0] - sent) * 1000, 2)
+            if seq in expected_latency:
+                entry["recorded_ms"] = round(expected_latency[seq] * 1000, 2)
+            if expected:
+                if len(received) < len(expected):
+                    entry["match"] = False
+                    entry["differs"] = ["<missing reply>"]
+                else:
+                    for want, (_, got) in zip(expected, received):
+                        entry["differs"] += differing_keys(normalize(want["line"]), normalize(got))
+                    entry["match"] = not entry["differs"]
+            if entry["recorded_ms"] is not None and entry["replay_ms"] is not None:
+                entry["slower"] = (
+                    entry["replay_ms"] > entry["recorded_ms"] * slower
+                    and entry["replay_ms"] - entry["recorded_ms"] > min_ms
+                )
+            results.append(entry)
+
+            # Later replies can't be attributed once the kernel stalls or exits
+            if label == "shutdown" or stalled:
+                break
+    finally:
+        proc.close()
+
+    return {
+        "trace": path,
+        "recorded_python": header.get("python"),
+        "recorded_env": header.get("env") or {},
+        "messages": results,
+        "mismatches": sum(1 for r in results if r["match"] is False),
+        "regressions": sum(1 for r in results if r["slower"]),
+    }
+
+
+def print_report(report: dict):
+    print(f"Replaying {report['trace']} (recorded on Python {report['recorded_python']})")
+    for name, value in sorted(report["recorded_env"].items()):
+        print(f"  {name}={value}")
+    print(f"{'seq':>5}  {'message':<28} {'recorded':>10} {'replay':>10}  result")
+    for r in report["messages"]:
+        rec = f"{r['recorded_ms']:.1f}ms" if r["recorded_ms"] is not None else "-"
+        rep = f"{r['replay_ms']:.1f}ms" if r["replay_ms"] is not None else "timeout"
+        if r["match"] is None:
+            verdict = "no recorded reply"
+        elif r["match"]:
+            verdict = "same"
+        else:
+            verdict = "differs: " + ", ".join(r["differs"])
+        if r["slower"]:
+            verdict += "  SLOWER"
+        print(f"{r['seq']:>5}  {r['message'][:28]:<28} {rec:>10} {rep:>10}  {verdict}")
+    print(f"{len(report['messages'])} messages, {report['mismatches']} differing, "
+          f"{report['regressions']} slower than recorded")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded kernel trace and compare.")
+    parser.add_argument("trace", help="Trace file written via ZEF_KERNEL_TRACE")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter to run the kernel with")
+    parser.add_argument("--kernel", default=KERNEL_SCRIPT, help="Kernel script to replay against")
+    parser.add_argument("--slower", type=float, default=1.5,
+                        help="Flag messages this many times slower than recorded (default: 1.5)")
+    parser.add_argument("--min-ms", type=float, default=5.0,
+                        help="Ignore slowdowns smaller than this (default: 5)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Seconds to wait for each reply (default: 60)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        report = replay(args.trace, args.python, args.kernel, args.slower, args.min_ms, args.timeout)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+    sys.exit(1 if report["mismatches"] or report["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
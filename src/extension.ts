@@ -1295,7 +1295,11 @@ async function writeOutputToFile(blockId: number, result: CellResult, documentUr
     // Format side effects as type-specific ET entries
     let sideEffectsContent = '';
     const sideEffects = result.side_effects || [];
-    if (sideEffects.length > 0) {
+    // Effects stop being recorded once a stream spills to disk; say so rather than cut silently
+    const truncation = Object.entries(result.spilled || {})
+        .filter(([, spill]) => spill)
+        .map(([stream, spill]) => `    # ${stream} truncated: ${spill!.lines} lines (${spill!.bytes} bytes) in total, see the preview`);
+    if (sideEffects.length > 0 || truncation.length > 0) {
         const effectStrings = sideEffects.map(effect => {
             if (effect.what === 'matplotlib_figure') {
                 // matplotlib_figure content is a value (PngImage('hash')), not a string
@@ -1313,7 +1317,8 @@ async function writeOutputToFile(blockId: number, result: CellResult, documentUr
                 .replace(/'/g, "\\'");
             return `    ET.UnmanagedEffect(\n        what='${effect.what}',\n        content='${escapedContent}'\n    )`;
         });
-        sideEffectsContent = '[\n' + effectStrings.join(',\n') + '\n]';
+        const entries = [effectStrings.join(',\n'), ...truncation].filter(entry => entry);
+        sideEffectsContent = '[\n' + entries.join('\n') + '\n]';
     } else {
         // Always write empty array when no side effects
         sideEffectsContent = '[]';
@@ -26,13 +26,104 @@ export interface CellResult {
         message: string;
         traceback: string;
     } | null;
+    budget?: BudgetInfo | null;  // Set when a cell limit was hit (output is partial)
+    spilled?: { stdout?: SpilledOutput; stderr?: SpilledOutput } | null;  // stdout/stderr hold only the head
+    autoreload?: AutoreloadReport | null;  // Set when edited user modules were reloaded before the cell
+    iterator?: LazyPage | null;  // Set when the result is an iterator; pull more with more()
+}
+
+// One batch of a lazily displayed iterator result. Items are reprs.
+export interface LazyPage {
+    handle: string;
+    label: string;          // repr of the iterator itself
+    start: number;          // index of items[0]
+    items: string[];
+    done: boolean;
+    total: number | null;   // known for ranges only
+    error: { type: string; message: string; traceback: string } | null;
+}
+
+export interface MoreResult {
+    command: 'more';
+    status: 'ok' | 'error';
+    iterator: LazyPage | null;
+    stdout: string;
+    stderr: string;
+    side_effects: SideEffect[];
+    error: { type: string; message: string; traceback: string } | null;
+    budget: BudgetInfo | null;
+}
+
+export interface AutoreloadReport {
+    modules: string[];                 // reloaded, in dependency order
+    failed: Record<string, string>;    // module -> error; these keep their previous contents
+    stale: string[];                   // classes that could not be patched in place
+}
+
+// Output of a stream that outgrew the kernel's spill threshold and went to
+// disk. Page through it with readOutput().
+export interface SpilledOutput {
+    handle: string;
+    bytes: number;
+    lines: number;
+}
+
+export interface OutputRange {
+    handle: string;
+    lines?: [number, number];  // end-exclusive
+    bytes: [number, number];
+    partial?: boolean;         // a single over-long line, cut
+    content: string;
+    total_bytes: number;
+    total_lines: number;
+}
+
+export interface CellLimits {
+    wall_time?: number;     // seconds
+    cpu_time?: number;      // seconds
+    memory_mb?: number;     // resident set size
+    output_bytes?: number;  // stdout + stderr
+}
+
+export interface BudgetInfo {
+    name: keyof CellLimits;
+    limit: number | null;
+    used: number | null;
 }
 
 interface ExecuteRequest {
     code: string;
     cell_id: string;
+    limits?: CellLimits;
 }
 
+// The kernel interrupts a cell after this many seconds and replies with the
+// partial output. The client-side timeout only guards against a hung kernel.
+const CELL_WALL_TIME_LIMIT = 30;
+const CLIENT_TIMEOUT_GRACE_MS = 5000;
+
+export interface CompletionMatch {
+    name: string;
+    kind: 'class' | 'module' | 'function' | 'property' | 'variable' | 'keyword';
+}
+
+export interface CompletionReply {
+    matches: CompletionMatch[];
+    cursor_start: number;
+    cursor_end: number;
+}
+
+export interface SignatureInfo {
+    label: string;
+    parameters: string[];
+    doc: string | null;
+    active_parameter: number;
+}
+
+// Completion queries are answered by the kernel's reader thread, even while a
+// cell runs, so they are matched to their replies by id instead of in order.
+const QUERY_TIMEOUT_MS = 2000;
+
 interface KernelMessage {
     status: string;
     message?: string;
@@ -51,6 +142,8 @@ export class KernelManager {
     private readyPromise: Promise<void> | null = null;
     private readyResolve: (() => void) | null = null;
     private outputChannel: vscode.OutputChannel;
+    private nextQueryId: number = 1;
+    private pendingQueries: Map<number, (reply: any) => void> = new Map();
 
     constructor(private extensionPath: string) {
         this.outputChannel = vscode.window.createOutputChannel('Zef Kernel');
@@ -75,9 +168,22 @@ export class KernelManager {
 
         this.outputChannel.appendLine(`Starting kernel: ${pythonPath} ${kernelScript}`);
 
+        const env: NodeJS.ProcessEnv = { ...process.env, MPLBACKEND: 'Agg' };
+        const startupProfile = vscode.workspace.getConfiguration('zef').get<string>('kernelStartupProfile');
+        if (startupProfile) {
+            env.ZEF_KERNEL_PROFILE = startupProfile;
+        }
+        const traceDir = vscode.workspace.getConfiguration('zef').get<string>('kernelTraceDir');
+        if (traceDir) {
+            const stamp = new Date().toISOString().replace(/[:.]/g, '-');
+            env.ZEF_KERNEL_TRACE = path.join(traceDir, `zef-kernel-${stamp}.trace.gz`);
+            this.outputChannel.appendLine(`Recording kernel trace to ${env.ZEF_KERNEL_TRACE}`);
+        }
+
+        const spawnedAt = Date.now();
         this.process = spawn(pythonPath, ['-u', kernelScript], {
             stdio: ['pipe', 'pipe', 'pipe'],
-            env: { ...process.env, MPLBACKEND: 'Agg' },
+            env,
         });
 
         if (!this.process.stdout || !this.process.stdin || !this.process.stderr) {
@@ -131,7 +237,7 @@ export class KernelManager {
         });
 
         await this.readyPromise;
-        this.outputChannel.appendLine('Kernel is ready');
+        this.outputChannel.appendLine(`Kernel is ready (${Date.now() - spawnedAt} ms after spawn)`);
     }
 
     /**
@@ -157,6 +263,16 @@ export class KernelManager {
                 return;
             }
 
+            // complete / signature / read_output replies, matched by id
+            if (message.command === 'complete' || message.command === 'signature' || message.command === 'read_output') {
+                const resolve = this.pendingQueries.get(message.id);
+                if (resolve) {
+                    this.pendingQueries.delete(message.id);
+                    resolve(message);
+                }
+                return;
+            }
+
             // inject_variables acknowledgement
             if (message.command === 'inject_variables') {
                 if (this.pendingResolve) {
@@ -168,6 +284,9 @@ export class KernelManager {
             }
 
             // This is a cell result
+            if (message.autoreload) {
+                this.logAutoreload(message.autoreload as AutoreloadReport);
+            }
             if (this.pendingResolve) {
                 this.pendingResolve(message as CellResult);
                 this.pendingResolve = null;
@@ -178,6 +297,20 @@ export class KernelManager {
         }
     }
 
+    private logAutoreload(report: AutoreloadReport): void {
+        if (report.modules.length > 0) {
+            this.outputChannel.appendLine(`Reloaded ${report.modules.join(', ')}`);
+        }
+        for (const [module, error] of Object.entries(report.failed)) {
+            this.outputChannel.appendLine(`Could not reload ${module}: ${error}`);
+        }
+        if (report.stale.length > 0) {
+            this.outputChannel.appendLine(
+                `Changed layout, existing instances keep the old class: ${report.stale.join(', ')}`
+            );
+        }
+    }
+
     /**
      * Check if the kernel is running
      */
@@ -201,6 +334,7 @@ export class KernelManager {
         const request: ExecuteRequest = {
             code,
             cell_id: cellId,
+            limits: { wall_time: CELL_WALL_TIME_LIMIT },
         };
 
         const json = JSON.stringify(request);
@@ -217,7 +351,7 @@ export class KernelManager {
                     this.pendingResolve = null;
                     this.pendingReject = null;
                 }
-            }, 30000); // 30 second timeout
+            }, CELL_WALL_TIME_LIMIT * 1000 + CLIENT_TIMEOUT_GRACE_MS);
 
             // Clear timeout when resolved
             const originalResolve = this.pendingResolve;
@@ -230,6 +364,42 @@ export class KernelManager {
         });
     }
 
+    /**
+     * Pull the next batch of a lazy iterator result. Pulling runs user code
+     * (the generator body), so it is queued behind cells and bounded by the
+     * same wall-time limit.
+     */
+    async more(handle: string, count: number = 20): Promise<MoreResult> {
+        if (!this.isAlive() || !this.process?.stdin) {
+            throw new Error('Kernel not available');
+        }
+
+        const json = JSON.stringify({
+            command: 'more',
+            handle,
+            count,
+            limits: { wall_time: CELL_WALL_TIME_LIMIT },
+        });
+
+        return new Promise((resolve, reject) => {
+            const timeout = setTimeout(() => {
+                if (this.pendingReject) {
+                    this.pendingReject(new Error('Iterator pull timeout'));
+                    this.pendingResolve = null;
+                    this.pendingReject = null;
+                }
+            }, CELL_WALL_TIME_LIMIT * 1000 + CLIENT_TIMEOUT_GRACE_MS);
+
+            this.pendingResolve = ((result: any) => {
+                clearTimeout(timeout);
+                resolve(result as MoreResult);
+            }) as any;
+            this.pendingReject = reject;
+
+            this.process!.stdin!.write(json + '\n');
+        });
+    }
+
     /**
      * Inject variables into the kernel namespace.
      * Starts the kernel if not already running.
@@ -279,6 +449,57 @@ export class KernelManager {
         });
     }
 
+    /**
+     * Complete the dotted name ending at cursorPos against the live namespace.
+     * Never starts the kernel; returns null if it is not running.
+     */
+    async complete(code: string, cursorPos: number): Promise<CompletionReply | null> {
+        const reply = await this.query('complete', { code, cursor_pos: cursorPos });
+        return reply && reply.status === 'ok' ? reply as CompletionReply : null;
+    }
+
+    /**
+     * Signature help for the innermost open call at cursorPos.
+     * Never starts the kernel; returns null if it is not running.
+     */
+    async signature(code: string, cursorPos: number): Promise<SignatureInfo | null> {
+        const reply = await this.query('signature', { code, cursor_pos: cursorPos });
+        return reply && reply.status === 'ok' ? reply.signature : null;
+    }
+
+    /**
+     * Read a range of a spilled cell output, by line (end-exclusive) or, with
+     * unit 'bytes', by byte offset. Answered even while a cell is running.
+     * Returns null if the kernel is not running or the handle is gone.
+     */
+    async readOutput(handle: string, start: number, end: number, unit: 'lines' | 'bytes' = 'lines'): Promise<OutputRange | null> {
+        const reply = await this.query('read_output', { handle, [unit]: [start, end] });
+        return reply && reply.status === 'ok' ? reply as OutputRange : null;
+    }
+
+    private query(command: 'complete' | 'signature' | 'read_output', fields: object): Promise<any> {
+        if (!this.isAlive() || !this.process?.stdin) {
+            return Promise.resolve(null);
+        }
+
+        const id = this.nextQueryId++;
+        const json = JSON.stringify({ command, id, ...fields });
+
+        return new Promise((resolve) => {
+            const timeout = setTimeout(() => {
+                this.pendingQueries.delete(id);
+                resolve(null);
+            }, QUERY_TIMEOUT_MS);
+
+            this.pendingQueries.set(id, (reply) => {
+                clearTimeout(timeout);
+                resolve(reply);
+            });
+
+            this.process!.stdin!.write(json + '\n');
+        });
+    }
+
     /**
      * Shutdown the kernel
      */
@@ -305,6 +526,8 @@ export class KernelManager {
         this.pythonPath = null;
         this.pendingResolve = null;
         this.pendingReject = null;
+        this.pendingQueries.forEach(resolve => resolve(null));
+        this.pendingQueries.clear();
 
         this.outputChannel.appendLine('Kernel shut down');
     }
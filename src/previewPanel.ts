@@ -2,7 +2,7 @@ import * as vscode from 'vscode';
 import * as path from 'path';
 import * as fs from 'fs';
 import { marked } from 'marked';
-import { CellResult } from './kernelManager';
+import { CellResult, getKernelManager } from './kernelManager';
 import { isZefDocument, isZefPythonFile, isZefRustFile } from './zefUtils';
 import { stripFrontmatter, getDocumentSettings, updateDocumentSetting, parseDocumentFrontmatter, renderDocumentFrontmatter, ZefSettings } from './frontmatterParser';
 import { ExcalidrawEditorPanel, generateExcalidrawUid } from './excalidrawEditorPanel';
@@ -813,6 +813,10 @@ export function createPreviewPanel(context: vscode.ExtensionContext): vscode.Web
                     }
                 }
             }
+        } else if (message.type === 'readOutput' && extensionPath) {
+            // Page through output the kernel spilled to disk; a restarted kernel answers null
+            const range = await getKernelManager(extensionPath).readOutput(message.handle, message.start, message.end);
+            await panel.webview.postMessage({ type: 'outputRange', blockId: message.blockId, stream: message.stream, range });
         } else if (message.type === 'openWikiLink') {
             // Resolve and open an Obsidian-style [[wiki link]]
             const target = message.target as string;
@@ -3004,6 +3008,31 @@ function getWebviewContent(renderedHtml: string, existingOutputs: { [blockId: nu
             color: var(--text-muted);
         }
 
+        .spill-note {
+            display: flex;
+            align-items: center;
+            gap: 8px;
+            margin-top: 8px;
+            font-size: 0.75rem;
+            color: var(--text-dim);
+            font-style: italic;
+        }
+
+        .spill-page {
+            font-size: 0.7rem;
+            padding: 2px 8px;
+            background: transparent;
+            color: var(--text-dim);
+            border: 1px solid var(--border-color);
+            border-radius: 4px;
+            cursor: pointer;
+        }
+
+        .spill-page:disabled {
+            cursor: default;
+            opacity: 0.6;
+        }
+
         .side-effect-item {
             padding: 4px 12px;
             margin-top: 6px;
@@ -4787,6 +4816,41 @@ function getWebviewContent(renderedHtml: string, existingOutputs: { [blockId: nu
             }
         }
 
+        // Lines of spilled cell output shown at once. Paging replaces the
+        // window rather than growing it, so the view stays small however
+        // much output the kernel holds on disk.
+        var OUTPUT_PAGE_LINES = 2000;
+
+        function spillNoteText(stream, firstLine, endLine, totalLines) {
+            if (firstLine === 0 && endLine >= totalLines) {
+                return 'Showing all ' + totalLines + ' lines of ' + stream + '.';
+            }
+            return 'Output truncated: showing lines ' + (firstLine + 1) + '-' + endLine + ' of ' + totalLines + ' of ' + stream + '.';
+        }
+
+        // direction: 1 for the page after the shown window, -1 for the one before it
+        function pageOutput(button, direction) {
+            var note = button.closest('.spill-note');
+            if (!note) return;
+            var start, end;
+            if (direction > 0) {
+                start = parseInt(note.dataset.nextLine);
+                end = start + OUTPUT_PAGE_LINES;
+            } else {
+                end = parseInt(note.dataset.firstLine);
+                start = Math.max(end - OUTPUT_PAGE_LINES, 0);
+            }
+            note.querySelectorAll('.spill-page').forEach(function(b) { b.disabled = true; });
+            vscode.postMessage({
+                type: 'readOutput',
+                blockId: parseInt(note.dataset.blockId),
+                stream: note.dataset.stream,
+                handle: note.dataset.handle,
+                start: start,
+                end: end
+            });
+        }
+
         function expandFigure(button) {
             var img = button.closest('.figure-wrapper').querySelector('img');
             if (!img) return;
@@ -7206,12 +7270,33 @@ function getWebviewContent(renderedHtml: string, existingOutputs: { [blockId: nu
                                     html += '<div style="margin-top: 12px; padding-top: 8px; border-top: 1px solid var(--border-color);">';
                                     html += '<div style="font-size: 0.65rem; text-transform: uppercase; letter-spacing: 0.1em; color: var(--text-dim); margin-bottom: 4px;">stdout</div>';
                                 }
-                                html += '<div style="color: var(--text-dim); white-space: pre-wrap; font-family: monospace; opacity: 0.8;">' + 
+                                html += '<div id="stdout-output-' + blockId + '" style="color: var(--text-dim); white-space: pre-wrap; font-family: monospace; opacity: 0.8;">' + 
                                         escapeHtml(result.stdout) + '</div>';
                                 if (result.result) {
                                     html += '</div>';
                                 }
                             }
+                            // Output past the kernel's spill threshold stays on disk; only its head is here
+                            if (result.spilled) {
+                                ['stdout', 'stderr'].forEach(function(stream) {
+                                    var spill = result.spilled[stream];
+                                    if (!spill) return;
+                                    var head = result[stream] || '';
+                                    if (stream === 'stderr') {
+                                        html += '<div style="margin-top: 12px; padding-top: 8px; border-top: 1px solid var(--border-color);">' +
+                                            '<div style="font-size: 0.65rem; text-transform: uppercase; letter-spacing: 0.1em; color: var(--text-dim); margin-bottom: 4px;">stderr</div>' +
+                                            '<div id="stderr-output-' + blockId + '" style="color: #e06c75; white-space: pre-wrap; font-family: monospace; opacity: 0.8;">' +
+                                            escapeHtml(head) + '</div></div>';
+                                    }
+                                    // Resume from the first line the head doesn't hold in full
+                                    var nextLine = (head.match(/\\n/g) || []).length;
+                                    html += '<div class="spill-note" id="spill-' + stream + '-' + blockId + '" data-handle="' + escapeHtml(spill.handle) + '"' +
+                                        ' data-stream="' + stream + '" data-block-id="' + blockId + '" data-first-line="0" data-next-line="' + nextLine + '" data-total-lines="' + spill.lines + '">' +
+                                        '<span class="spill-note-text">' + spillNoteText(stream, 0, nextLine, spill.lines) + '</span>' +
+                                        '<button class="spill-page spill-page-earlier" onclick="pageOutput(this, -1)" disabled>Show earlier</button>' +
+                                        '<button class="spill-page spill-page-later" onclick="pageOutput(this, 1)">Show more</button></div>';
+                                });
+                            }
                             // Show matplotlib figures if any — these are rendered inside sideEffectsValue below
                             // (figures are side effects, rendered as type-specific UI elements)
                             
@@ -7316,6 +7401,33 @@ function getWebviewContent(renderedHtml: string, existingOutputs: { [blockId: nu
                     }
                 }
                 
+                // A page of spilled output asked for by pageOutput(); it replaces the shown window
+                if (message.type === 'outputRange') {
+                    var note = document.getElementById('spill-' + message.stream + '-' + message.blockId);
+                    var target = document.getElementById(message.stream + '-output-' + message.blockId);
+                    if (note) {
+                        var range = message.range;
+                        var earlier = note.querySelector('.spill-page-earlier');
+                        var later = note.querySelector('.spill-page-later');
+                        var text = note.querySelector('.spill-note-text');
+                        if (!range || !target) {
+                            text.textContent = 'Output truncated; the rest is no longer available (kernel restarted).';
+                            earlier.remove();
+                            later.remove();
+                        } else {
+                            var total = parseInt(note.dataset.totalLines);
+                            target.textContent = range.content;
+                            note.dataset.firstLine = String(range.lines[0]);
+                            note.dataset.nextLine = String(range.lines[1]);
+                            text.textContent = range.partial
+                                ? 'Output truncated: line ' + (range.lines[0] + 1) + ' is too long to show in full.'
+                                : spillNoteText(message.stream, range.lines[0], range.lines[1], total);
+                            earlier.disabled = range.lines[0] === 0;
+                            later.disabled = range.partial || range.lines[1] >= total;
+                        }
+                    }
+                }
+                
                 // Handle Svelte compilation results
                 if (message.type === 'svelteResult') {
                     var blockId = message.blockId;